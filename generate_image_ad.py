@@ -2,14 +2,16 @@
 
 import os
 import sys
-import io
-import base64
+import csv
+import json
+import hashlib
 import uuid
 import argparse
 import traceback
 import threading
+from functools import lru_cache
 from dataclasses import dataclass
-from typing import List, Dict, Union, Tuple, Optional
+from typing import List, Dict, Union, Tuple, Optional, Callable
 import time
 
 # --- 避免在後台線程中初始化 Tkinter ---
@@ -18,7 +20,7 @@ import time
 # --- 核心套件載入 (分離 PIL 以使用延遲導入) ---
 try:
     import torch
-    from transformers import AutoProcessor, AutoModelForCausalLM, BitsAndBytesConfig
+    from transformers import AutoProcessor, AutoModelForCausalLM, BitsAndBytesConfig, TextIteratorStreamer
     from langchain_core.documents import Document
     from langchain.retrievers import MultiVectorRetriever
     from langchain.storage import InMemoryStore
@@ -34,6 +36,15 @@ os.environ["CHROMA_SERVER_NO_ANALYTICS"] = "True"
 doc_id_to_summary_map: Dict[str, str] = {}  # 確保類型提示
 ID_KEY = "doc_id"
 
+EMBEDDINGS_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+RAG_COLLECTION_NAME = "mm_rag"
+RAG_CACHE_DIRNAME = ".rag_cache"
+RAG_INDEX_MANIFEST = "index_manifest.json"
+RAG_THUMBNAIL_DIRNAME = "thumbnails"
+RAG_THUMBNAIL_MAX_EDGE = 560  # Llama 3.2 Vision 的單一 tile 尺寸
+RAG_IMAGE_LRU_SIZE = 32
+NARRATION_BATCH_SIZE = 4  # 每次 model.generate 同時生成的圖片數 (OOM 時會自動減半)
+
 # --- PIL 延遲導入 (避免預載入時的 DLL 問題) ---
 _PIL_Image = None
 
@@ -96,68 +107,79 @@ def set_Model(model_path: str) -> Tuple[Optional[AutoModelForCausalLM], Optional
         return None, None
 
 
-def encode_image_to_base64(image_path: str) -> str:
-    """將圖片檔案編碼為 Base64 字串"""
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
-
+def compute_file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """分塊計算檔案內容的 SHA-256，不將整個檔案載入記憶體"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
-def pil_image_to_base64(image, format="JPEG") -> str:
-    """將 PIL Image 物件轉換為 Base64 字串"""
-    buffered = io.BytesIO()
-    image.save(buffered, format=format)
-    return base64.b64encode(buffered.getvalue()).decode('utf-8')
 
-
-def base64_to_pil_image(base64_string: str):
-    """將 Base64 字串解碼為 PIL Image 物件"""
+def ensure_reference_thumbnail(image_path: str, image_hash: str, thumb_dir: str) -> str:
+    """為 RAG 範例圖片建立縮圖快取 (以內容雜湊命名)，回傳縮圖路徑；失敗時回傳原圖路徑"""
+    thumb_path = os.path.join(thumb_dir, f"{image_hash}.jpg")
+    if os.path.exists(thumb_path):
+        return thumb_path
     try:
         PILImage = get_pil_image()
-        img_data = base64.b64decode(base64_string)
-        return PILImage.open(io.BytesIO(img_data)).convert("RGB")
+        os.makedirs(thumb_dir, exist_ok=True)
+        with PILImage.open(image_path) as img:
+            img = img.convert("RGB")
+            img.thumbnail((RAG_THUMBNAIL_MAX_EDGE, RAG_THUMBNAIL_MAX_EDGE), PILImage.LANCZOS)
+            tmp_path = thumb_path + ".tmp"
+            img.save(tmp_path, format="JPEG", quality=90)
+        os.replace(tmp_path, thumb_path)
+        return thumb_path
     except Exception as e:
-        print(f"Base64 解碼為 PIL 圖片失敗: {e}")
-        return None
+        print(f"[警告] 建立縮圖快取失敗，將直接使用原圖: {image_path}，{e}")
+        return image_path
 
 
-def looks_like_base64(sb: str) -> bool:
-    import re
-    return re.match("^[A-Za-z0-9+/]+[=]{0,2}$", sb) is not None
-
-
-def is_image_data(b64data: str) -> bool:
-    signatures = {
-        b"\xFF\xD8\xFF": "jpg", b"\x89\x50\x4E\x47\x0D\x0A\x1A\x0A": "png",
-        b"\x47\x49\x46\x38": "gif", b"\x52\x49\x46\x46": "webp",
-    }
-    try:
-        header = base64.b64decode(b64data)[:8]
-        return any(header.startswith(sig) for sig in signatures)
-    except Exception:
-        return False
+@lru_cache(maxsize=RAG_IMAGE_LRU_SIZE)
+def load_reference_image(image_path: str):
+    """讀取 RAG 範例圖片並縮放至 RAG_THUMBNAIL_MAX_EDGE，結果以 LRU 快取於記憶體"""
+    PILImage = get_pil_image()
+    with PILImage.open(image_path) as img:
+        img = img.convert("RGB")
+    if max(img.size) > RAG_THUMBNAIL_MAX_EDGE:
+        img.thumbnail((RAG_THUMBNAIL_MAX_EDGE, RAG_THUMBNAIL_MAX_EDGE), PILImage.LANCZOS)
+    return img
 
 
 # --------------------------------------------------------------------------
 #                           RAG: Retriever (大部分不變)
 # --------------------------------------------------------------------------
 
-def create_multi_vector_retriever(vectorstore, texts: List[str], images_b64: List[str]) -> Optional[MultiVectorRetriever]:
-    """建立多向量檢索器，儲存 base64 圖片"""
+def create_multi_vector_retriever(
+    vectorstore,
+    texts: List[str],
+    image_paths: List[str],
+    doc_ids: Optional[List[str]] = None,
+) -> Optional[MultiVectorRetriever]:
+    """建立多向量檢索器，docstore 只儲存圖片 (或縮圖) 的檔案路徑。
+
+    若提供 doc_ids，表示向量資料庫已由 sync_persistent_vectorstore 同步完成，
+    此處僅填入 docstore，不再重新嵌入文字。
+    """
     store = InMemoryStore()
     retriever = MultiVectorRetriever(vectorstore=vectorstore, docstore=store, id_key=ID_KEY)
 
-    if not texts or not images_b64 or len(texts) != len(images_b64):
+    if not texts or not image_paths or len(texts) != len(image_paths):
         print("[錯誤] 圖片與文字數量不一致或為空。", file=sys.stderr)
         return None
 
-    doc_ids = [str(uuid.uuid4()) for _ in images_b64]
-    summary_docs = [Document(page_content=s, metadata={ID_KEY: doc_ids[i]}) for i, s in enumerate(texts)]
-    original_docs = [Document(page_content=content, metadata={ID_KEY: doc_ids[i]}) for i, content in enumerate(images_b64)]
+    vectorstore_synced = doc_ids is not None
+    if doc_ids is None:
+        doc_ids = [str(uuid.uuid4()) for _ in image_paths]
+    original_docs = [Document(page_content=path, metadata={ID_KEY: doc_ids[i]}) for i, path in enumerate(image_paths)]
 
     try:
-        retriever.vectorstore.add_documents(summary_docs)
+        if not vectorstore_synced:
+            summary_docs = [Document(page_content=s, metadata={ID_KEY: doc_ids[i]}) for i, s in enumerate(texts)]
+            retriever.vectorstore.add_documents(summary_docs)
         retriever.docstore.mset(list(zip(doc_ids, original_docs)))
-        print(f"已成功添加 {len(images_b64)} 個項目到檢索器。")
+        print(f"已成功添加 {len(image_paths)} 個項目到檢索器。")
     except Exception as e:
         print(f"[錯誤] 添加文件到向量儲存或檔案儲存時失敗: {e}", file=sys.stderr)
         traceback.print_exc(file=sys.stderr)
@@ -168,15 +190,123 @@ def create_multi_vector_retriever(vectorstore, texts: List[str], images_b64: Lis
     return retriever
 
 
-def set_DB(texts: List[str], imgs_b64: List[str]) -> Optional[MultiVectorRetriever]:
-    """初始化向量資料庫並建立檢索器"""
+def get_rag_cache_dir() -> str:
+    """RAG 持久化快取目錄 (data/.rag_cache)"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", RAG_CACHE_DIRNAME)
+
+
+def compute_pair_doc_id(text: str, image_hash: str) -> str:
+    """以文字與圖片內容雜湊計算穩定的文件 ID，內容不變則 ID 不變"""
+    h = hashlib.sha256()
+    h.update(text.encode("utf-8"))
+    h.update(b"\0")
+    h.update(image_hash.encode("ascii"))
+    return h.hexdigest()
+
+
+def compute_corpus_hash(doc_ids: List[str], embeddings_model_name: str = EMBEDDINGS_MODEL_NAME) -> str:
+    """整個語料庫的內容雜湊 (與順序無關)"""
+    h = hashlib.sha256(embeddings_model_name.encode("utf-8"))
+    for doc_id in sorted(set(doc_ids)):
+        h.update(doc_id.encode("ascii"))
+    return h.hexdigest()
+
+
+def _load_index_manifest(manifest_path: str) -> dict:
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[警告] 讀取 RAG 索引清單失敗，將重新比對索引: {e}")
+        return {}
+
+
+def _save_index_manifest(manifest_path: str, manifest: dict) -> None:
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def sync_persistent_vectorstore(vectorstore, texts: List[str], doc_ids: List[str], manifest_path: str) -> None:
+    """讓磁碟上的向量資料庫與目前語料一致。
+
+    語料雜湊與清單相同時直接使用；否則只嵌入新增/修改的配對並刪除已移除的配對。
+    """
+    corpus_hash = compute_corpus_hash(doc_ids)
+    manifest = _load_index_manifest(manifest_path)
+    if manifest.get("corpus_hash") == corpus_hash:
+        print(f"RAG 索引內容未變更 ({corpus_hash[:12]})，直接載入磁碟上的向量資料庫。")
+        return
+
+    existing_ids = set(vectorstore.get(include=[]).get("ids", []))
+    stale_model = manifest.get("embedding_model") not in (None, EMBEDDINGS_MODEL_NAME)
+    if stale_model:
+        print("[提示] 嵌入模型已變更，將重建整個 RAG 索引。")
+
+    wanted = dict(zip(doc_ids, texts))
+    to_delete = existing_ids if stale_model else existing_ids - wanted.keys()
+    to_add = [doc_id for doc_id in wanted if stale_model or doc_id not in existing_ids]
+
+    if to_delete:
+        vectorstore.delete(ids=list(to_delete))
+    if to_add:
+        summary_docs = [Document(page_content=wanted[doc_id], metadata={ID_KEY: doc_id}) for doc_id in to_add]
+        vectorstore.add_documents(summary_docs, ids=to_add)
+    print(f"RAG 索引已增量更新：新增 {len(to_add)} 筆，刪除 {len(to_delete)} 筆，保留 {len(wanted) - len(to_add)} 筆。")
+
+    _save_index_manifest(manifest_path, {
+        "corpus_hash": corpus_hash,
+        "embedding_model": EMBEDDINGS_MODEL_NAME,
+        "collection_name": RAG_COLLECTION_NAME,
+        "doc_count": len(wanted),
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+
+
+def set_DB(texts: List[str], image_paths: List[str], persist_directory: Optional[str] = None) -> Optional[MultiVectorRetriever]:
+    """初始化向量資料庫並建立檢索器。
+
+    預設將 Chroma 集合與範例縮圖持久化於 data/.rag_cache；傳入空字串則改用記憶體內集合並直接引用原圖。
+    """
     try:
-        embeddings_model_name = "sentence-transformers/all-MiniLM-L6-v2"
         device = "cuda" if torch.cuda.is_available() else "cpu"
-        embeddings = HuggingFaceEmbeddings(model_name=embeddings_model_name, model_kwargs={'device': device})
-        vectorstore = Chroma(collection_name=f"mm_rag_{uuid.uuid4()}", embedding_function=embeddings)
+        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL_NAME, model_kwargs={'device': device})
+    except Exception as e:
+        print(f"[嚴重錯誤] 載入嵌入模型時失敗: {e}", file=sys.stderr)
+        traceback.print_exc(file=sys.stderr)
+        return None
+
+    if persist_directory is None:
+        persist_directory = get_rag_cache_dir()
+
+    if persist_directory:
+        try:
+            os.makedirs(persist_directory, exist_ok=True)
+            vectorstore = Chroma(
+                collection_name=RAG_COLLECTION_NAME,
+                embedding_function=embeddings,
+                persist_directory=persist_directory,
+            )
+            image_hashes = [compute_file_sha256(p) for p in image_paths]
+            doc_ids = [compute_pair_doc_id(t, h) for t, h in zip(texts, image_hashes)]
+            sync_persistent_vectorstore(
+                vectorstore, texts, doc_ids, os.path.join(persist_directory, RAG_INDEX_MANIFEST)
+            )
+            thumb_dir = os.path.join(persist_directory, RAG_THUMBNAIL_DIRNAME)
+            image_refs = [ensure_reference_thumbnail(p, h, thumb_dir) for p, h in zip(image_paths, image_hashes)]
+            print(f"向量資料庫初始化完成 (持久化於 {persist_directory})。")
+            return create_multi_vector_retriever(vectorstore, texts, image_refs, doc_ids=doc_ids)
+        except Exception as e:
+            print(f"[警告] 持久化向量資料庫失敗，改用記憶體內資料庫: {e}", file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+
+    try:
+        vectorstore = Chroma(collection_name=f"{RAG_COLLECTION_NAME}_{uuid.uuid4()}", embedding_function=embeddings)
         print("向量資料庫初始化完成。")
-        return create_multi_vector_retriever(vectorstore, texts, imgs_b64)
+        return create_multi_vector_retriever(vectorstore, texts, image_paths)
     except Exception as e:
         print(f"[嚴重錯誤] 設定向量資料庫或檢索器時失敗: {e}", file=sys.stderr)
         traceback.print_exc(file=sys.stderr)
@@ -218,21 +348,21 @@ def load_pairs_from_data_dirs() -> Tuple[List[str], List[str]]:
                 print(f"[警告] 讀取文字檔失敗: {fp}，{e}")
 
     exts = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
-    texts_db, imgs_db_b64 = [], []
+    texts_db, img_paths_db = [], []
     for fn in sorted(os.listdir(img_dir)):
         if fn.lower().endswith(exts):
             stem = os.path.splitext(fn)[0]
             if stem in text_map:
                 img_fp = os.path.join(img_dir, fn)
-                try:
-                    imgs_db_b64.append(encode_image_to_base64(img_fp))
+                if os.path.isfile(img_fp):
+                    img_paths_db.append(img_fp)
                     texts_db.append(text_map[stem])
-                except Exception as e:
-                    print(f"[警告] 載入或編碼圖片失敗: {img_fp}，{e}")
+                else:
+                    print(f"[警告] 圖片不是有效檔案: {img_fp}")
             else:
                 print(f"[警告] 找不到與圖片對應的文字檔：{fn}，已略過。")
-    print(f"已從資料夾載入 {len(imgs_db_b64)} 組圖片/文字配對建立 RAG 資料庫。")
-    return texts_db, imgs_db_b64
+    print(f"已從資料夾載入 {len(img_paths_db)} 組圖片/文字配對建立 RAG 資料庫。")
+    return texts_db, img_paths_db
 
 
 # --------------------------------------------------------------------------
@@ -256,21 +386,19 @@ def get_llama_inputs_for_single_image_narration(
         print(f"將使用 {len(retrieved_docs)} 個檢索到的文件作為參考範例。")
         for i, doc in enumerate(retrieved_docs):
             doc_id = doc.metadata.get(ID_KEY)
-            original_image_b64 = doc.page_content
+            example_image_path = doc.page_content
             example_narration = doc_id_to_summary_map.get(doc_id, "[範例口述影像遺失]")
 
-            if looks_like_base64(original_image_b64) and is_image_data(original_image_b64):
-                example_image_pil = base64_to_pil_image(original_image_b64)
-                if example_image_pil:
-                    all_images_pil.append(example_image_pil)
-                    prompt_content_list.append({"type": "text", "text": f"\n--- 範例 {i+1} ---"})
-                    prompt_content_list.append({"type": "image", "content": example_image_pil})
-                    prompt_content_list.append({"type": "text", "text": f"範例 {i+1} 的口述影像:\n{example_narration}"})
-                    retrieved_count += 1
-                else:
-                    print(f"警告：無法將檢索到的文件 ID {doc_id} 的 Base64 轉換為圖片。")
-            else:
-                print(f"警告：檢索到的文件 ID {doc_id} 的內容不是有效的 Base64 圖片。")
+            try:
+                example_image_pil = load_reference_image(example_image_path)
+            except Exception as e:
+                print(f"警告：無法讀取檢索到的文件 ID {doc_id} 的範例圖片 {example_image_path}: {e}")
+                continue
+            all_images_pil.append(example_image_pil)
+            prompt_content_list.append({"type": "text", "text": f"\n--- 範例 {i+1} ---"})
+            prompt_content_list.append({"type": "image", "content": example_image_pil})
+            prompt_content_list.append({"type": "text", "text": f"範例 {i+1} 的口述影像:\n{example_narration}"})
+            retrieved_count += 1
 
     if retrieved_count == 0:
         prompt_content_list.append({"type": "text", "text": "(未找到相關範例)\n"})
@@ -304,8 +432,8 @@ def ensure_resources(model_path: str, *, force_reload: bool = False) -> Optional
         if not model or not processor:
             return None
 
-        data_texts, data_imgs_b64 = load_pairs_from_data_dirs()
-        retriever = set_DB(data_texts, data_imgs_b64) if data_texts and data_imgs_b64 else None
+        data_texts, data_img_paths = load_pairs_from_data_dirs()
+        retriever = set_DB(data_texts, data_img_paths) if data_texts and data_img_paths else None
 
         _cached_resources = ImageNarrationResources(
             model_path=model_path,
@@ -320,9 +448,61 @@ def clear_cached_resources() -> None:
     global _cached_resources
     with _resources_lock:
         _cached_resources = None
+    load_reference_image.cache_clear()
 
 
-def _generate_narration_with_resources(resources: ImageNarrationResources, image_file: str, user_desc: str) -> str:
+def _build_generate_kwargs(processor) -> dict:
+    return {
+        "max_new_tokens": 512, "do_sample": True, "top_p": 0.9,
+        "temperature": 0.1,
+        "pad_token_id": processor.tokenizer.eos_token_id,
+        "eos_token_id": processor.tokenizer.eos_token_id,
+    }
+
+
+def _stream_generate(model, processor, inputs, generate_kwargs: dict, on_text: Callable[[str], None]) -> str:
+    """在背景執行緒中執行 model.generate，每解碼出一段文字就呼叫 on_text"""
+    streamer = TextIteratorStreamer(processor.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    errors: List[BaseException] = []
+
+    def _worker():
+        try:
+            with torch.inference_mode():
+                model.generate(
+                    input_ids=inputs["input_ids"],
+                    attention_mask=inputs["attention_mask"],
+                    streamer=streamer,
+                    **generate_kwargs
+                )
+        except BaseException as e:
+            errors.append(e)
+            streamer.end()  # 確保下方的迭代會結束
+
+    worker = threading.Thread(target=_worker, daemon=True)
+    worker.start()
+
+    chunks = []
+    for text in streamer:
+        if not text:
+            continue
+        chunks.append(text)
+        try:
+            on_text(text)
+        except Exception as e:
+            print(f"[警告] 串流輸出回呼失敗: {e}", file=sys.stderr)
+    worker.join()
+
+    if errors:
+        raise errors[0]
+    return "".join(chunks).strip()
+
+
+def _generate_narration_with_resources(
+    resources: ImageNarrationResources,
+    image_file: str,
+    user_desc: str,
+    on_text: Optional[Callable[[str], None]] = None,
+) -> str:
     model = resources.model
     processor = resources.processor
     retriever = resources.retriever
@@ -368,21 +548,19 @@ def _generate_narration_with_resources(resources: ImageNarrationResources, image
         raise
 
     print("\n正在生成口述影像...")
-    generate_kwargs = {
-        "max_new_tokens": 512, "do_sample": True, "top_p": 0.9,
-        "temperature": 0.1,
-        "pad_token_id": processor.tokenizer.eos_token_id,
-        "eos_token_id": processor.tokenizer.eos_token_id,
-    }
+    generate_kwargs = _build_generate_kwargs(processor)
     try:
-        output = model.generate(
-            input_ids=inputs["input_ids"],
-            attention_mask=inputs["attention_mask"],
-            **generate_kwargs
-        )
-        response_text = processor.decode(
-            output[0][inputs["input_ids"].shape[-1]:], skip_special_tokens=True
-        ).strip()
+        if on_text is not None:
+            response_text = _stream_generate(model, processor, inputs, generate_kwargs, on_text)
+        else:
+            output = model.generate(
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                **generate_kwargs
+            )
+            response_text = processor.decode(
+                output[0][inputs["input_ids"].shape[-1]:], skip_special_tokens=True
+            ).strip()
 
         print("\n--- 模型生成的口述影像 ---")
         print(response_text)
@@ -394,6 +572,134 @@ def _generate_narration_with_resources(resources: ImageNarrationResources, image
         raise
 
 
+def _retrieve_docs_batch(retriever: Optional[MultiVectorRetriever], queries: List[str]) -> List[List[Document]]:
+    """一次檢索多筆描述的參考範例；批次檢索失敗時退回逐筆檢索"""
+    if not retriever:
+        print("[警告] RAG 檢索器未成功建立，將不使用參考範例。")
+        return [[] for _ in queries]
+
+    print(f"\n正在批次檢索 {len(queries)} 筆描述的參考範例...")
+    try:
+        return retriever.batch(queries)
+    except Exception as e:
+        print(f"[警告] 批次 RAG 檢索失敗，改為逐筆檢索: {e}", file=sys.stderr)
+
+    results = []
+    for query in queries:
+        try:
+            results.append(retriever.invoke(query))
+        except Exception as e:
+            print(f"[警告] 執行 RAG 檢索時失敗: {e}", file=sys.stderr)
+            results.append([])
+    return results
+
+
+def _generate_batch_chunk(resources: ImageNarrationResources, prepared: List[Tuple[list, list]]) -> List[str]:
+    """將多組 (圖片, 訊息) 左側補齊後堆疊為單次 processor / model.generate 呼叫"""
+    model = resources.model
+    processor = resources.processor
+    tokenizer = processor.tokenizer
+
+    texts = [
+        processor.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
+        for _, messages in prepared
+    ]
+    images = [llama_images for llama_images, _ in prepared]
+
+    # 生成時需左側補齊，才能讓每筆輸入的最後一個 token 對齊
+    original_padding_side = tokenizer.padding_side
+    tokenizer.padding_side = "left"
+    try:
+        inputs = processor(images=images, text=texts, padding=True, return_tensors="pt").to(model.device)
+    finally:
+        tokenizer.padding_side = original_padding_side
+
+    with torch.inference_mode():
+        output = model.generate(**inputs, **_build_generate_kwargs(processor))
+
+    prompt_length = inputs["input_ids"].shape[-1]
+    return [processor.decode(seq[prompt_length:], skip_special_tokens=True).strip() for seq in output]
+
+
+def _generate_narrations_with_resources(
+    resources: ImageNarrationResources,
+    items: List[Tuple[str, str]],
+    batch_size: int = NARRATION_BATCH_SIZE,
+) -> List[Tuple[Optional[str], str]]:
+    results: List[Tuple[Optional[str], str]] = [(None, os.path.abspath(image_file)) for image_file, _ in items]
+
+    PILImage = get_pil_image()
+    valid_indices, target_images = [], []
+    for i, (image_file, _) in enumerate(items):
+        try:
+            target_images.append(PILImage.open(image_file).convert("RGB"))
+            valid_indices.append(i)
+        except Exception as e:
+            print(f"[錯誤] 讀取目標圖片失敗，已略過: {image_file}，{e}", file=sys.stderr)
+
+    if not valid_indices:
+        return results
+
+    queries = [items[i][1].strip() for i in valid_indices]
+    retrieved = _retrieve_docs_batch(resources.retriever, queries)
+    prepared = [
+        get_llama_inputs_for_single_image_narration(target_images[k], queries[k], retrieved[k])
+        for k in range(len(valid_indices))
+    ]
+
+    size = max(1, batch_size)
+    start = 0
+    while start < len(prepared):
+        chunk = prepared[start:start + size]
+        chunk_indices = valid_indices[start:start + size]
+        print(f"\n正在批次生成口述影像 ({start + 1}-{start + len(chunk)}/{len(prepared)})...")
+        try:
+            texts = _generate_batch_chunk(resources, chunk)
+        except torch.cuda.OutOfMemoryError:
+            if size > 1:
+                torch.cuda.empty_cache()
+                size = max(1, size // 2)
+                print(f"[警告] 顯示記憶體不足，批次大小降為 {size} 後重試。", file=sys.stderr)
+                continue
+            print(f"[錯誤] 單張圖片生成仍顯示記憶體不足，已略過: {items[chunk_indices[0]][0]}", file=sys.stderr)
+            torch.cuda.empty_cache()
+            texts = [None]
+        except Exception as e:
+            print(f"[嚴重錯誤] 批次生成口述影像時失敗: {e}", file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            texts = [None] * len(chunk)
+
+        for idx, text in zip(chunk_indices, texts):
+            results[idx] = (text, results[idx][1])
+        start += len(chunk)
+
+    return results
+
+
+def generate_narrations_batch(
+    items: List[Tuple[str, str]],
+    *,
+    model_path: Optional[str] = None,
+    batch_size: int = NARRATION_BATCH_SIZE,
+) -> List[Tuple[Optional[str], str]]:
+    """
+    批次為多張圖片生成口述影像。
+    items 為 (圖片路徑, 描述) 的列表；回傳依輸入順序排列的 (口述影像, 圖片絕對路徑)，
+    失敗的項目口述影像為 None。未指定 model_path 時使用已預載入的資源。
+    """
+    if model_path:
+        resources = ensure_resources(model_path)
+        if not resources:
+            raise RuntimeError("無法載入模型或處理器。")
+    else:
+        with _resources_lock:
+            if not _cached_resources:
+                raise RuntimeError("模型資源尚未預載入，無法執行生成。")
+            resources = _cached_resources
+
+    return _generate_narrations_with_resources(resources, list(items), batch_size)
+
+
 def generate_narration(model_path: str, image_file: str, user_desc: str, *, include_final_markers: bool = False) -> Tuple[str, str]:
     resources = ensure_resources(model_path)
     if not resources:
@@ -409,10 +715,15 @@ def generate_narration(model_path: str, image_file: str, user_desc: str, *, incl
     return response_text, final_image_path
 
 
-def generate_narration_from_preloaded(image_file: str, user_desc: str) -> Tuple[str, str]:
+def generate_narration_from_preloaded(
+    image_file: str,
+    user_desc: str,
+    on_text: Optional[Callable[[str], None]] = None,
+) -> Tuple[str, str]:
     """
     (新函式) 使用已預載入的資源生成口述影像。
     如果資源未載入，則會引發 RuntimeError。
+    提供 on_text 時改為串流生成，每解碼出一段文字就會在生成執行緒之外呼叫一次。
     """
     global _cached_resources
     with _resources_lock:
@@ -422,7 +733,7 @@ def generate_narration_from_preloaded(image_file: str, user_desc: str) -> Tuple[
         resources = _cached_resources
 
     # 呼叫核心生成邏輯
-    response_text = _generate_narration_with_resources(resources, image_file, user_desc)
+    response_text = _generate_narration_with_resources(resources, image_file, user_desc, on_text=on_text)
     final_image_path = os.path.abspath(image_file)
 
     return response_text, final_image_path
@@ -443,6 +754,144 @@ def preload_resources(model_path: str) -> Optional[ImageNarrationResources]:
         return None
 
 
+# --------------------------------------------------------------------------
+#                        批次模式 (目錄或清單檔)
+# --------------------------------------------------------------------------
+
+BATCH_IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+
+def _pick_field(row: dict, *keys: str) -> str:
+    for key in keys:
+        value = row.get(key)
+        if value:
+            return str(value).strip()
+    return ""
+
+
+def collect_batch_items(input_path: str, default_desc: str = "") -> List[Tuple[str, str]]:
+    """
+    從目錄或清單檔收集 (圖片路徑, 描述)。
+    - 目錄：所有圖片檔，描述取自同名 .txt (若存在)，否則使用 default_desc。
+    - .jsonl / .csv：每筆需有 image (或 image_file) 與 desc (或 description) 欄位，
+      相對路徑以清單檔所在目錄為基準。
+    """
+    items: List[Tuple[str, str]] = []
+    if os.path.isdir(input_path):
+        for fn in sorted(os.listdir(input_path)):
+            if not fn.lower().endswith(BATCH_IMAGE_EXTS):
+                continue
+            image_file = os.path.join(input_path, fn)
+            desc_file = os.path.splitext(image_file)[0] + ".txt"
+            desc = _read_text_file(desc_file).strip() if os.path.isfile(desc_file) else default_desc
+            items.append((image_file, desc))
+        return items
+
+    base_dir = os.path.dirname(os.path.abspath(input_path))
+    ext = os.path.splitext(input_path)[1].lower()
+    if ext == ".jsonl":
+        with open(input_path, "r", encoding="utf-8") as f:
+            rows = []
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    print(f"[警告] 清單檔第 {line_no} 行不是有效的 JSON，已略過: {e}")
+    elif ext == ".csv":
+        with open(input_path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        raise ValueError(f"不支援的批次輸入格式: {input_path} (需為目錄、.jsonl 或 .csv)")
+
+    for row in rows:
+        image_file = _pick_field(row, "image", "image_file")
+        if not image_file:
+            print(f"[警告] 清單項目缺少圖片路徑，已略過: {row}")
+            continue
+        if not os.path.isabs(image_file):
+            image_file = os.path.join(base_dir, image_file)
+        items.append((image_file, _pick_field(row, "desc", "description") or default_desc))
+    return items
+
+
+def _load_completed_images(output_path: str) -> set:
+    """讀取既有輸出檔，回傳已成功生成的圖片絕對路徑 (供中斷後續跑)"""
+    completed = set()
+    if not os.path.isfile(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 中斷時可能留下不完整的最後一行
+            if record.get("narration"):
+                completed.add(os.path.abspath(record.get("image", "")))
+    return completed
+
+
+def run_batch_narration(
+    model_path: str,
+    input_path: str,
+    output_path: str,
+    default_desc: str = "",
+    batch_size: int = NARRATION_BATCH_SIZE,
+) -> Tuple[int, int]:
+    """
+    批次生成口述影像：模型只載入一次，每完成一個批次就附加寫入 JSONL 輸出檔。
+    已在輸出檔中成功生成的圖片會被略過。回傳 (成功數, 失敗數)。
+    """
+    items = collect_batch_items(input_path, default_desc)
+    completed = _load_completed_images(output_path)
+    pending = []
+    for image_file, desc in items:
+        if os.path.abspath(image_file) in completed:
+            continue
+        if not desc:
+            print(f"[警告] 圖片缺少描述，已略過: {image_file}")
+            continue
+        pending.append((image_file, desc))
+
+    print(f"批次項目共 {len(items)} 筆，已完成 {len(items) - len(pending)} 筆，待處理 {len(pending)} 筆。")
+    if not pending:
+        return 0, 0
+
+    resources = ensure_resources(model_path)
+    if not resources:
+        raise RuntimeError("無法載入模型或處理器。")
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    succeeded = failed = 0
+    step = max(1, batch_size)
+    with open(output_path, "a", encoding="utf-8") as out:
+        for start in range(0, len(pending), step):
+            chunk = pending[start:start + step]
+            chunk_start = time.time()
+            results = _generate_narrations_with_resources(resources, chunk, batch_size)
+            elapsed = time.time() - chunk_start
+            for (image_file, desc), (narration, final_image_path) in zip(chunk, results):
+                record = {
+                    "image": final_image_path,
+                    "desc": desc,
+                    "narration": narration,
+                    "elapsed_sec": round(elapsed / len(chunk), 3),
+                }
+                if narration:
+                    succeeded += 1
+                else:
+                    failed += 1
+                    record["error"] = "生成失敗"
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            print(f"已完成 {start + len(chunk)}/{len(pending)} 筆 (本批耗時 {elapsed:.2f} 秒)。")
+
+    return succeeded, failed
+
+
 # --- 命令列參數解析 ---
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="使用 Llama 3.2 Vision 進行單張圖片的口述影像生成 (RAG 輔助)")
@@ -450,6 +899,9 @@ if __name__ == "__main__":
     parser.add_argument("--image_file", type=str, help="要生成口述影像的單張圖片檔案路徑")
     parser.add_argument("--desc", type=str, help="使用者提供的關於該圖片的初步描述或重點")
     parser.add_argument("--preload", action="store_true", help="僅預載入模型與資料庫，不進行生成")
+    parser.add_argument("--batch_input", type=str, help="批次模式：圖片目錄或 .jsonl / .csv 清單檔")
+    parser.add_argument("--batch_output", type=str, help="批次模式的 JSONL 輸出檔 (已完成的項目會被略過)")
+    parser.add_argument("--batch_size", type=int, default=NARRATION_BATCH_SIZE, help="批次模式每次同時生成的圖片數")
 
     args = parser.parse_args()
 
@@ -466,6 +918,24 @@ if __name__ == "__main__":
             sys.exit(0)
         sys.exit(1)
 
+    if args.batch_input:
+        if not os.path.exists(args.batch_input):
+            print(f"[錯誤] 批次輸入不存在: {args.batch_input}", file=sys.stderr)
+            sys.exit(1)
+        batch_output = args.batch_output or os.path.splitext(args.batch_input.rstrip("/\\"))[0] + "_narrations.jsonl"
+        try:
+            succeeded, failed = run_batch_narration(
+                args.model_path, args.batch_input, batch_output,
+                default_desc=(args.desc or "").strip(), batch_size=args.batch_size,
+            )
+        except Exception as e:
+            print(f"[嚴重錯誤] 批次生成失敗: {e}", file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            sys.exit(1)
+        print(f"\n批次生成完成：成功 {succeeded} 筆，失敗 {failed} 筆，結果已寫入 {batch_output}")
+        print(f"--- 程式執行完畢，總耗時: {time.time() - start_time:.2f} 秒 ---")
+        sys.exit(1 if failed else 0)
+
     if not args.image_file or not args.desc:
         print("[錯誤] 進行生成時必須提供 --image_file 以及 --desc。", file=sys.stderr)
         sys.exit(1)
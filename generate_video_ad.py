@@ -12,9 +12,17 @@ import re
 from datetime import timedelta
 import sys
 import json
+import hashlib
+import wave
 import tempfile
 import math
-from typing import List, Tuple
+import bisect
+import subprocess
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_EXCEPTION, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Sequence, Tuple
 import traceback
 import argparse # 新增
 
@@ -22,14 +30,15 @@ import argparse # 新增
 try:
     import scenedetect
     from scenedetect.detectors import ContentDetector
+    from scenedetect.scene_manager import compute_downscale_factor
     import google.generativeai as genai
     from PIL import Image
     from google.api_core.exceptions import ResourceExhausted, GoogleAPICallError, NotFound
-    from voice_interface import synthesize_speech_to_file_async, AzureTTSException
-    from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip, vfx
-    import moviepy.audio.fx.all as afx # 【核心修正】導入音訊效果模組
+    from voice_interface import synthesize_speech_cached_async, AzureTTSException, AzureTTSHTTPError
+    from moviepy.editor import VideoFileClip, AudioFileClip
     from mutagen.mp3 import MP3
     import whisper
+    import torch
 except ImportError as e:
     
     # --- 修改 ---
@@ -44,80 +53,271 @@ nest_asyncio.apply()
 # --------------------------------------------------------------------------
 #                           【使用者設定區】
 # --------------------------------------------------------------------------
-try:
-    with open('api_key.txt', 'r', encoding='utf-8') as f:
-        API_KEY = f.read().strip()
-    if not API_KEY:
-        raise FileNotFoundError
-except FileNotFoundError:
-    # messagebox.showerror("API 金鑰錯誤", "找不到 'api_key.txt' 檔案，或檔案內容為空。請建立此檔案並填入您的 Google API 金鑰。") # 移除
-    # --- 修改 ---
-    print("[嚴重錯誤] 找不到 'api_key.txt' 檔案，或檔案內容為空。請建立此檔案並填入您的 Google API 金鑰。", file=sys.stderr)
-    # --- 修改結束 ---
-    sys.exit(1)
+API_KEY_FILENAME = 'api_key.txt'
+
+def load_api_key() -> str:
+    """
+    讀取 Google API 金鑰；找不到或內容為空時引發 FileNotFoundError。
+    金鑰在執行流程時才讀取，平行擷取的子程序匯入本模組時不會因此結束。
+    """
+    try:
+        with open(API_KEY_FILENAME, 'r', encoding='utf-8') as f:
+            api_key = f.read().strip()
+    except FileNotFoundError:
+        api_key = ""
+    if not api_key:
+        raise FileNotFoundError(f"找不到 '{API_KEY_FILENAME}' 檔案，或檔案內容為空。請建立此檔案並填入您的 Google API 金鑰。")
+    return api_key
 
 SECONDS_PER_CHAR = 0.2682
 VOICE = "zh-TW-HsiaoChenNeural"
 VOICE_LOCALE = "zh-TW"
 BACKGROUND_VOLUME = 0.7
 NARRATION_VOLUME = 1.9
-MAX_SPEEDUP_FACTOR = 1.15
+# 旁白加速以 WSOLA 進行，不改變音高，因此可容許較大的加速倍率；
+# 若關閉 TIME_STRETCH_PRESERVE_PITCH (改用重取樣，音高會升高) 建議改回 1.15
+MAX_SPEEDUP_FACTOR = 1.35
+TIME_STRETCH_PRESERVE_PITCH = True
+# 步驟 5 旁白排程："greedy" (逐句放入最近可用區段) 或 "optimal" (動態規劃，最小化總偏移、加速與捨棄句數)
+TIMELINE_PLANNER = "greedy"
+TIMELINE_DRIFT_COST = 1.0        # 每偏離理想時間 1 秒的成本
+TIMELINE_SPEEDUP_COST = 20.0     # 每加速 1.0 倍 (乘上語音秒數) 的成本
+TIMELINE_DROP_COST = 30.0        # 捨棄一句旁白的成本
+TIMELINE_LOOKAHEAD_SEGMENTS = 4  # optimal 模式下每句最多往後嘗試的無人聲區段數
+TIMELINE_MAX_STATES = 64         # optimal 模式下每句保留的狀態數上限
 AUTO_CLEANUP_TEMP_FILES = True
+# 步驟 6：原始視訊編碼可直接放入 MP4 時，只混音並以 stream copy 封裝，不重新編碼畫面
+STEP6_STREAM_COPY = True
+STREAM_COPY_VIDEO_CODECS = ("h264", "hevc", "mpeg4", "av1", "vp9")
+FINAL_AUDIO_SAMPLE_RATE = 44100
+NARRATION_DUCKING_VOLUME = 0.6   # 旁白期間背景音再乘上此倍率 (1.0 為不壓低)
+NARRATION_DUCKING_FADE = 0.15    # 背景音壓低 / 回復的淡入淡出秒數
+MIX_BLOCK_SECONDS = 10           # 步驟 6 逐段解碼與混音的區塊長度，記憶體用量與影片長度無關
+WHISPER_SAMPLE_RATE = 16000
+# 人聲偵測後端："whisper" (完整辨識，最準確) 或 "vad" (能量 + 頻譜特徵，CPU 上快得多)
+SPEECH_DETECTION_BACKEND = "whisper"
+# 關鍵影格清晰度評分 (可各自獨立開啟)
+SHARPNESS_PROXY_WIDTH = 0        # >0 時先將灰階影格縮小至此寬度再計算 (例如 640)
+SHARPNESS_FRAME_STRIDE = 1       # >1 時每 N 幀評分一次，再於峰值附近逐幀精修
+SHARPNESS_FAST_DTYPE = False     # True 時以 int16 Laplacian + float32 統計取代 float64
+KEYFRAME_EXTRACTION_WORKERS = 1  # >1 時將影片依關鍵畫格切成時間分段，以多程序平行擷取
+KEYFRAME_MIN_SHARD_SECONDS = 60  # 每個分段的最短長度，避免短片切得過碎
+KEYFRAME_SHARD_WARMUP_FRAMES = 30  # 每個分段 (第一段除外) 先往前多讀的影格數，讓場景偵測器暖機
+CANCEL_CHECK_FRAMES = 24         # 步驟 1 每解碼幾幀檢查一次是否已取消
+PIPELINE_STREAMING = True        # 人聲偵測、關鍵影格擷取與初步描述同時進行 (僅在單程序擷取時生效)
+# 關鍵影格上傳設定：步驟 1 寫檔時即套用，步驟 2 / 3 只會讀到處理後的影格
+KEYFRAME_UPLOAD_MAX_EDGE = 1024  # 長邊超過此像素時等比縮小 (0 為不縮放)
+KEYFRAME_UPLOAD_JPEG_QUALITY = 85
+KEYFRAME_UPLOAD_GRAYSCALE = False
+KEYFRAME_UPLOAD_CROP = None      # (左, 上, 右, 下) 比例裁切，例如 (0, 0.12, 1, 0.88) 去除上下黑邊；None 為不裁切
+GEMINI_MAX_CONCURRENCY = 4       # 步驟 2 同時進行的描述鏈數量
+GEMINI_INITIAL_RPS = 1.0         # 速率限制器的初始每秒請求數
+GEMINI_MAX_RPS = 4.0             # 成功時逐步調升的上限
+GEMINI_MIN_RPS = 0.1             # 遇到 ResourceExhausted 時調降的下限
+GEMINI_STREAM_CHAIN_LENGTH = 8   # 串流模式下每條描述鏈的影格數 (總數未知，無法事先平均切分)
+GEMINI_FRAMES_PER_REQUEST = 1    # >1 時將連續 K 張關鍵影格打包成一次請求，要求以 JSON 逐張回傳描述
+GEMINI_MODEL_NAME = "gemini-2.5-flash"
+GEMINI_CACHE_ENABLED = True      # 將步驟 2 / 3 的 Gemini 回應依內容雜湊快取於磁碟
+GEMINI_CACHE_DIRNAME = ".gemini_cache"
+GEMINI_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 超過此大小時自最久未使用的項目開始淘汰
+GEMINI_CACHE_EVICT_TARGET = 0.9  # 淘汰時降到上限的此比例，避免接下來每次寫入都觸發目錄掃描
+TTS_CACHE_DIRNAME = ".tts_cache"  # 步驟 4 的語音檔依 (文字, 音色, 語速, 語系, 格式) 快取於 data/ 下
+TTS_INITIAL_CONCURRENCY = 4      # 步驟 4 初始同時合成數，依 429 / 5xx 與延遲自動調整
+TTS_MAX_CONCURRENCY = 16
+TTS_LATENCY_TARGET = 8.0         # 單次合成超過此秒數視為服務端壅塞，併發數減一
+TTS_MAX_ATTEMPTS = 5             # 每句在主要階段的最多嘗試次數 (之後另有一輪單線重試)
+TTS_BACKOFF_BASE = 1.0
+TTS_BACKOFF_MAX = 30.0
 
 # --------------------------------------------------------------------------
 
-def step0_detect_voice_segments(video_path: str, model_size: str = "small", verbose: bool = False) -> List[Tuple[float, float]]:
+_whisper_models = {}
+_whisper_models_lock = threading.Lock()
+
+def get_whisper_model(model_size: str = "small", device: str = None):
+    """載入 Whisper 模型並依 (大小, 裝置) 快取，同一程序內只載入一次"""
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    key = (model_size, device)
+    with _whisper_models_lock:
+        model = _whisper_models.get(key)
+        if model is None:
+            print(f"  - 下載 / 載入 Whisper 模型 ({model_size}, {device})...")
+            model = whisper.load_model(model_size, device=device)
+            _whisper_models[key] = model
+        else:
+            print(f"  - 使用已快取的 Whisper 模型 ({model_size}, {device})。")
+        return model
+
+def _audio_decode_cmd(path: str, sample_rate: int, channels: int) -> List[str]:
+    return [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", path,
+        "-map", "0:a:0?", "-vn", "-f", "f32le", "-ac", str(channels), "-acodec", "pcm_f32le", "-ar", str(sample_rate), "-",
+    ]
+
+def decode_audio(path: str, sample_rate: int, channels: int = 1):
+    """
+    以 ffmpeg 將音檔或影片音軌直接解碼為 float32 NumPy 陣列 (樣本數, 聲道數)，不寫入暫存檔。
+    沒有音軌時回傳 None。整條音軌會留在記憶體中，長音軌請改用 iter_audio_blocks。
+    """
+    proc = subprocess.run(_audio_decode_cmd(path, sample_rate, channels), capture_output=True)
+    if proc.returncode != 0:
+        stderr_text = proc.stderr.decode("utf-8", errors="replace")
+        if "does not contain any stream" in stderr_text:
+            return None
+        raise RuntimeError(f"ffmpeg 解碼音訊失敗: {stderr_text.strip()[-500:]}")
+    if not proc.stdout:
+        return None
+    return np.frombuffer(proc.stdout, np.float32).reshape(-1, channels)
+
+def iter_audio_blocks(path: str, sample_rate: int, channels: int, block_frames: int):
+    """
+    與 decode_audio 相同的解碼，但逐塊讀取 ffmpeg 的輸出：每次產生 block_frames 個樣本 (最後一塊可能較短)
+    的唯讀 float32 陣列 (樣本數, 聲道數)。沒有音軌時不產生任何區塊；提前結束迭代時會終止 ffmpeg。
+    """
+    frame_bytes = channels * 4
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(_audio_decode_cmd(path, sample_rate, channels), stdout=subprocess.PIPE, stderr=stderr_file)
+        try:
+            while True:
+                data = proc.stdout.read(block_frames * frame_bytes)
+                usable = len(data) - len(data) % frame_bytes
+                if usable:
+                    yield np.frombuffer(data, np.float32, count=usable // 4).reshape(-1, channels)
+                if len(data) < block_frames * frame_bytes: break
+            proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+        if proc.returncode != 0:
+            stderr_file.seek(0)
+            stderr_text = stderr_file.read().decode("utf-8", errors="replace")
+            if "does not contain any stream" in stderr_text:
+                return
+            raise RuntimeError(f"ffmpeg 解碼音訊失敗: {stderr_text.strip()[-500:]}")
+
+def load_audio_16k(video_path: str, sample_rate: int = WHISPER_SAMPLE_RATE):
+    """將影片音軌解碼為單聲道 float32 陣列；影片沒有音軌時回傳 None"""
+    audio = decode_audio(video_path, sample_rate, channels=1)
+    return None if audio is None else audio[:, 0]
+
+def merge_speech_segments(speech_segments: List[Tuple[float, float]], max_gap: float = 0.15) -> List[Tuple[float, float]]:
+    """合併間隔不超過 max_gap 秒的人聲區段"""
+    merged = []
+    if speech_segments:
+        sorted_segments = sorted(speech_segments)
+        current_start, current_end = sorted_segments[0]
+        for next_start, next_end in sorted_segments[1:]:
+            if next_start <= current_end + max_gap:
+                current_end = max(current_end, next_end)
+            else:
+                merged.append((current_start, current_end))
+                current_start, current_end = next_start, next_end
+        merged.append((current_start, current_end))
+    return merged
+
+def detect_speech_segments_vad(
+    audio: np.ndarray,
+    sample_rate: int = WHISPER_SAMPLE_RATE,
+    frame_ms: float = 32.0,
+    hop_ms: float = 16.0,
+    energy_margin_db: float = 12.0,
+    min_energy_db: float = -50.0,
+    min_band_ratio: float = 0.6,
+    max_flatness: float = 0.45,
+    smoothing_frames: int = 9,
+    min_speech_length: float = 0.1,
+    chunk_frames: int = 4096,
+) -> List[Tuple[float, float]]:
+    """
+    輕量級人聲偵測 (VAD)：以向量化方式計算每個音框的能量、人聲頻帶 (80~4000 Hz) 能量比例
+    與頻譜平坦度，三者皆符合才視為人聲，再以多數決平滑並轉為時間區段。
+    """
+    frame_len = int(sample_rate * frame_ms / 1000)
+    hop = int(sample_rate * hop_ms / 1000)
+    if audio is None or len(audio) < frame_len:
+        return []
+
+    frames_view = np.lib.stride_tricks.sliding_window_view(audio, frame_len)[::hop]
+    n_frames = frames_view.shape[0]
+    window = np.hanning(frame_len).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_len, d=1.0 / sample_rate)
+    band = (freqs >= 80) & (freqs <= 4000)
+
+    energy_db = np.empty(n_frames, dtype=np.float32)
+    band_ratio = np.empty(n_frames, dtype=np.float32)
+    flatness = np.empty(n_frames, dtype=np.float32)
+    eps = 1e-10
+    # 分塊處理，避免長片一次展開所有音框佔用大量記憶體
+    for start in range(0, n_frames, chunk_frames):
+        chunk = frames_view[start:start + chunk_frames].astype(np.float32)
+        energy_db[start:start + len(chunk)] = 10.0 * np.log10(np.mean(chunk * chunk, axis=1) + eps)
+        power = np.abs(np.fft.rfft(chunk * window, axis=1)) ** 2 + eps
+        total = power.sum(axis=1)
+        band_ratio[start:start + len(chunk)] = power[:, band].sum(axis=1) / total
+        flatness[start:start + len(chunk)] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+    noise_floor = float(np.percentile(energy_db, 10))
+    energy_threshold = max(noise_floor + energy_margin_db, min_energy_db)
+    is_speech = (energy_db > energy_threshold) & (band_ratio > min_band_ratio) & (flatness < max_flatness)
+
+    if smoothing_frames > 1:
+        votes = np.convolve(is_speech.astype(np.float32), np.ones(smoothing_frames, dtype=np.float32), mode="same")
+        is_speech = votes > (smoothing_frames / 2.0)
+
+    edges = np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    segments = [
+        (float(s * hop / sample_rate), float((e * hop + frame_len) / sample_rate))
+        for s, e in zip(starts, ends)
+    ]
+    return [(s, e) for s, e in segments if e - s >= min_speech_length]
+
+def step0_detect_voice_segments(video_path: str, model_size: str = "small", verbose: bool = False, backend: str = None) -> List[Tuple[float, float]]:
+    backend = (backend or SPEECH_DETECTION_BACKEND).lower()
+    backend_label = "輕量級 VAD" if backend == "vad" else "Whisper"
     print("\n" + "="*50)
-    print("--- 步驟 0: 偵測影片中有人聲的區段（使用 Whisper） ---")
+    print(f"--- 步驟 0: 偵測影片中有人聲的區段（使用 {backend_label}） ---")
     print("="*50)
     if not os.path.exists(video_path):
         print(f"[錯誤] 找不到影片檔案：{video_path}")
         return []
-    
-    tmp_dir = tempfile.mkdtemp(prefix="video_audio_")
-    tmp_audio_path = os.path.join(tmp_dir, "extracted_audio.wav")
 
     try:
-        with VideoFileClip(video_path) as video:
-            if video.audio is None:
-                print("  - 影片沒有音軌，跳過語音偵測。")
-                return []
-            print("  - 擷取影片音軌至暫存檔...")
-            video.audio.write_audiofile(tmp_audio_path, fps=16000, logger=None)
+        print("  - 直接解碼影片音軌為 16 kHz 音訊...")
+        audio = load_audio_16k(video_path)
+        if audio is None or audio.size == 0:
+            print("  - 影片沒有音軌，跳過語音偵測。")
+            return []
+
+        if backend == "vad":
+            speech_segments = merge_speech_segments(detect_speech_segments_vad(audio))
+            print(f"  - VAD 偵測到 {len(speech_segments)} 段有人聲區間。")
+            for i, (s, e) in enumerate(speech_segments, start=1):
+                print(f"    {i}. {s:.3f}s 〜 {e:.3f}s (長度 {(e-s):.3f}s)")
+            return speech_segments
 
-        print(f"  - 下載 / 載入 Whisper 模型 ({model_size})...")
-        model = whisper.load_model(model_size)
+        model = get_whisper_model(model_size)
 
         print("  - 呼叫 whisper.transcribe 進行語音辨識與時間戳偵測...")
-        result = model.transcribe(tmp_audio_path, word_timestamps=False, verbose=verbose)
+        result = model.transcribe(audio, word_timestamps=False, verbose=verbose, fp16=(model.device.type == "cuda"))
         
         segments = result.get("segments", [])
         speech_segments = [(float(s.get("start", 0.0)), float(s.get("end", 0.0))) for s in segments if float(s.get("end", 0.0)) - float(s.get("start", 0.0)) >= 0.05]
 
-        merged = []
-        if speech_segments:
-            sorted_segments = sorted(speech_segments)
-            current_start, current_end = sorted_segments[0]
-            for next_start, next_end in sorted_segments[1:]:
-                if next_start <= current_end + 0.15:
-                    current_end = max(current_end, next_end)
-                else:
-                    merged.append((current_start, current_end))
-                    current_start, current_end = next_start, next_end
-            merged.append((current_start, current_end))
-        
-        speech_segments = merged
+        speech_segments = merge_speech_segments(speech_segments)
         print(f"  - Whisper 偵測到 {len(speech_segments)} 段有人聲區間。")
         for i, (s, e) in enumerate(speech_segments, start=1):
             print(f"    {i}. {s:.3f}s 〜 {e:.3f}s (長度 {(e-s):.3f}s)")
         return speech_segments
 
     except Exception as e:
-        print(f"[警告] 使用 Whisper 偵測語音時發生錯誤: {e}")
+        print(f"[警告] 使用 {backend_label} 偵測語音時發生錯誤: {e}")
         print("  - 這通常代表 ffmpeg 未正確安裝或設定在系統 PATH 中。")
         return []
-    finally:
-        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 def get_non_dialogue_segments(speech_segments: List[Tuple[float, float]], video_duration: float, min_silence_length: float = 0.25) -> List[Tuple[float, float]]:
     nonspeech_segments = []
@@ -130,9 +330,10 @@ def get_non_dialogue_segments(speech_segments: List[Tuple[float, float]], video_
         nonspeech_segments.append((cursor, video_duration))
     return nonspeech_segments
 
-def imwrite_unicode(path, image):
+def imwrite_unicode(path, image, quality: int = None):
     try:
-        is_success, buffer = cv2.imencode(".jpg", image)
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)] if quality else []
+        is_success, buffer = cv2.imencode(".jpg", image, params)
         if not is_success: return False
         with open(path, 'wb') as f:
             f.write(buffer)
@@ -141,17 +342,210 @@ def imwrite_unicode(path, image):
         print(f"寫入檔案時發生錯誤: {e}")
         return False
 
-def calculate_sharpness(image: np.ndarray) -> float:
+def prepare_keyframe_for_upload(image: np.ndarray, max_edge: int = None, grayscale: bool = None,
+                                crop=None) -> np.ndarray:
+    """依上傳設定裁切、轉灰階並縮小關鍵影格 (清晰度評分仍使用原始影格)"""
+    max_edge = KEYFRAME_UPLOAD_MAX_EDGE if max_edge is None else max_edge
+    grayscale = KEYFRAME_UPLOAD_GRAYSCALE if grayscale is None else grayscale
+    crop = KEYFRAME_UPLOAD_CROP if crop is None else crop
+    if crop:
+        h, w = image.shape[:2]
+        left, top, right, bottom = crop
+        x0, x1 = int(round(w * left)), int(round(w * right))
+        y0, y1 = int(round(h * top)), int(round(h * bottom))
+        if x1 > x0 and y1 > y0:
+            image = image[y0:y1, x0:x1]
+    if grayscale and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    h, w = image.shape[:2]
+    if max_edge and max(h, w) > max_edge:
+        scale = max_edge / max(h, w)
+        image = cv2.resize(image, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))),
+                           interpolation=cv2.INTER_AREA)
+    return image
+
+def write_keyframe(output_dir: str, frame_num: int, fps: float, image: np.ndarray) -> bool:
+    path = os.path.join(output_dir, keyframe_filename(frame_num, fps))
+    return imwrite_unicode(path, prepare_keyframe_for_upload(image), quality=KEYFRAME_UPLOAD_JPEG_QUALITY)
+
+def calculate_sharpness(image: np.ndarray, proxy_width: int = 0, fast_dtype: bool = False) -> float:
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    if proxy_width and gray.shape[1] > proxy_width:
+        proxy_height = max(1, int(round(gray.shape[0] * proxy_width / gray.shape[1])))
+        gray = cv2.resize(gray, (proxy_width, proxy_height), interpolation=cv2.INTER_AREA)
+    if fast_dtype:
+        _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+        return float(std[0][0]) ** 2
     return cv2.Laplacian(gray, cv2.CV_64F).var()
 
-def handle_api_call(model, prompt_parts, max_retries=3):
+class AdaptiveRateLimiter:
+    """
+    Token bucket 速率限制器 (執行緒安全)。
+    遇到速率限制時將速率減半 (乘法遞減)，每次成功則小幅調升 (加法遞增)。
+    """
+    def __init__(self, rate: float = GEMINI_INITIAL_RPS, max_rate: float = GEMINI_MAX_RPS,
+                 min_rate: float = GEMINI_MIN_RPS, capacity: float = 1.0):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait_time = (1.0 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2.0)
+            self._tokens = 0.0
+            print(f"    [速率限制] 調降請求速率為每秒 {self.rate:.2f} 次。")
+
+class GeminiResponseCache:
+    """
+    以內容雜湊為鍵的 Gemini 回應磁碟快取 (執行緒安全)。
+    鍵由模型名稱、提示文字、圖片內容雜湊與字數上限組成；任一項改變即視為新的請求。
+    每個項目存成一個 JSON 檔，讀取時更新 mtime，總大小超過上限時依 mtime 淘汰最舊的項目。
+    總大小在第一次寫入時掃描一次，之後隨寫入與淘汰累計；只有超過上限時才再掃描目錄。
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = GEMINI_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model_name: str, prompt_text: str, image_hash: str = "", max_chars=None) -> str:
+        h = hashlib.sha256()
+        for part in (model_name, prompt_text, image_hash, "" if max_chars is None else str(max_chars)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = json.load(f)["text"]
+            os.utime(path, None)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"text": text, "created": time.time()}, f, ensure_ascii=False)
+            new_size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"    [警告] 無法寫入 Gemini 快取: {e}")
+            return
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._total_bytes += new_size - old_size
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"): continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self) -> None:
+        """超過上限時依 mtime 淘汰，直到總大小降至上限的 GEMINI_CACHE_EVICT_TARGET"""
+        with self._lock:
+            entries = self._scan()
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                target = int(self.max_bytes * GEMINI_CACHE_EVICT_TARGET)
+                for _, size, path in sorted(entries):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    if total <= target: break
+            self._total_bytes = total
+
+_gemini_cache = None
+
+def get_gemini_cache():
+    """取得共用的 Gemini 回應快取 (data/.gemini_cache)；停用時回傳 None"""
+    global _gemini_cache
+    if not GEMINI_CACHE_ENABLED:
+        return None
+    if _gemini_cache is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", GEMINI_CACHE_DIRNAME)
+        try:
+            _gemini_cache = GeminiResponseCache(cache_dir)
+        except OSError as e:
+            print(f"[警告] 無法建立 Gemini 快取目錄，將不使用快取: {e}")
+            return None
+    return _gemini_cache
+
+def compute_file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def handle_api_call(model, prompt_parts, max_retries=3, rate_limiter: AdaptiveRateLimiter = None):
     for retries in range(max_retries):
         try:
+            if rate_limiter: rate_limiter.acquire()
             response = model.generate_content(prompt_parts)
+            if rate_limiter: rate_limiter.on_success()
             return response
         except (ResourceExhausted, GoogleAPICallError) as e:
             if isinstance(e, ResourceExhausted) or (hasattr(e, 'code') and e.code == 429):
+                if rate_limiter: rate_limiter.on_throttle()
                 wait_time = (2 ** (retries + 1)) + random.uniform(0, 1)
                 print(f"    [警告] 觸發 API 速率限制。將在 {wait_time:.2f} 秒後重試...")
                 time.sleep(wait_time)
@@ -160,56 +554,319 @@ def handle_api_call(model, prompt_parts, max_retries=3):
     print(f"    [錯誤] API 速率限制達到最大重試次數，放棄。")
     return None
 
-def step1_extract_keyframes(video_path: str, output_dir: str, threshold: float = 27.0):
+def keyframe_filename(frame_num: int, fps: float) -> str:
+    """以影格時間命名關鍵影格 (mm-ss-mmm.jpg)"""
+    total_millis = int((frame_num / fps) * 1000)
+    minutes, seconds, millis = total_millis // 60000, (total_millis % 60000) // 1000, total_millis % 1000
+    return f"{minutes:02d}-{seconds:02d}-{millis:03d}.jpg"
+
+def scan_scenes_and_sharpness(video, threshold: float, start_frame: int = 0, end_frame: int = None,
+                              stride: int = 1, proxy_width: int = 0, fast_dtype: bool = False, should_cancel=None):
+    """
+    單次解碼：每一幀同時送入 ContentDetector 做場景切換偵測並計算清晰度分數。
+    stride > 1 時只為每 N 幀評分，其餘為 NaN。
+    每 CANCEL_CHECK_FRAMES 幀呼叫一次 should_cancel()，回傳 True 時引發 PipelineCancelled。
+    回傳 (切點影格列表, 每幀清晰度分數陣列, 實際讀到的結束影格)。
+    """
+    stride = max(1, stride)
+    detector = ContentDetector(threshold=threshold)
+    downscale = compute_downscale_factor(video.frame_size[0])
+    if start_frame:
+        video.seek(start_frame)
+
+    cuts, scores = [], []
+    frame_num = start_frame
+    while end_frame is None or frame_num < end_frame:
+        if (frame_num - start_frame) % CANCEL_CHECK_FRAMES == 0:
+            raise_if_cancelled(should_cancel)
+        frame = video.read()
+        if frame is None or frame is False: break
+        detect_frame = frame
+        if downscale > 1:
+            h, w = frame.shape[:2]
+            detect_frame = cv2.resize(frame, (w // downscale, h // downscale), interpolation=cv2.INTER_AREA)
+        cuts.extend(detector.process_frame(frame_num, detect_frame))
+        if (frame_num - start_frame) % stride == 0:
+            scores.append(calculate_sharpness(frame, proxy_width, fast_dtype))
+        else:
+            scores.append(np.nan)
+        frame_num += 1
+    cuts.extend(detector.post_process(frame_num))
+
+    cuts = sorted({int(c) for c in cuts if start_frame < c < frame_num})
+    return cuts, np.asarray(scores, dtype=np.float32), frame_num
+
+def scenes_from_cuts(cuts: List[int], start_frame: int, end_frame: int, fps: float) -> List[Tuple[int, int]]:
+    """由切點建立 [起始, 結束) 區段；沒有切點時以每 5 秒固定間隔取樣"""
+    if not cuts:
+        print("[警告] 在影片中偵測不到場景變化，將以固定間隔取樣。")
+        step = max(1, int(round(fps * 5)))
+        bounds = list(range(start_frame, end_frame, step)) + [end_frame]
+    else:
+        bounds = [start_frame] + cuts + [end_frame]
+    return [(s, e) for s, e in zip(bounds[:-1], bounds[1:]) if s < e]
+
+def fetch_frames(video, frame_nums: List[int]) -> Iterator[Tuple[int, np.ndarray]]:
+    """依影格順序 seek 並逐一讀出指定影格 (影格編號, 影像)；讀取失敗的影格略過，同一時間只持有一張全解析度影像"""
+    for frame_num in sorted(set(frame_nums)):
+        video.seek(frame_num)
+        frame = video.read()
+        if frame is not None and frame is not False:
+            yield frame_num, frame
+
+def refine_best_frames(video, scenes: List[Tuple[int, int]], scores: np.ndarray, offset: int,
+                       stride: int, proxy_width: int = 0, fast_dtype: bool = False) -> Iterator[Tuple[int, int, int, np.ndarray]]:
+    """
+    以粗略分數找出每個區段的峰值，並在峰值前後 stride 幀內逐幀重新評分。
+    每完成一個區段就產出 (起始, 結束, 最佳影格, 影格影像)，由呼叫端立即寫檔；stride 為 1 時直接讀取最佳影格。
+    """
+    coarse = []
+    for start_frame, end_frame in scenes:
+        scene_scores = scores[start_frame - offset:end_frame - offset]
+        if scene_scores.size and not np.all(np.isnan(scene_scores)):
+            peak = start_frame + int(np.nanargmax(scene_scores))
+        else:
+            peak = start_frame
+        coarse.append((start_frame, end_frame, peak))
+
+    if stride <= 1:
+        scene_of = {peak: (s, e) for s, e, peak in coarse}
+        for peak, frame in fetch_frames(video, list(scene_of)):
+            yield (*scene_of[peak], peak, frame)
+        return
+
+    for start_frame, end_frame, peak in coarse:
+        window_start = max(start_frame, peak - stride + 1)
+        window_end = min(end_frame, peak + stride)
+        video.seek(window_start)
+        best_num, best_frame, best_score = None, None, -1.0
+        for frame_num in range(window_start, window_end):
+            frame = video.read()
+            if frame is None or frame is False: break
+            score = calculate_sharpness(frame, proxy_width, fast_dtype)
+            if score > best_score:
+                best_num, best_frame, best_score = frame_num, frame, score
+        if best_frame is not None:
+            yield start_frame, end_frame, best_num, best_frame
+
+def probe_keyframe_frames(video_path: str, fps: float) -> List[int]:
+    """
+    以 ffprobe 讀取封包旗標 (不解碼) 取得視訊關鍵畫格 (I-frame) 的影格編號。
+    pts 會先扣除串流的 start_time，與單程序解碼時從 0 起算的影格編號一致。
+    """
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=start_time:packet=pts_time,flags", "-of", "json", video_path,
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        probe = json.loads(proc.stdout)
+    except Exception as e:
+        print(f"  [警告] 無法以 ffprobe 取得關鍵畫格位置，將平均切分: {e}")
+        return []
+    streams = probe.get("streams") or [{}]
+    try:
+        start_time = float(streams[0].get("start_time", 0.0))
+    except (TypeError, ValueError):
+        start_time = 0.0
+    frames = set()
+    for packet in probe.get("packets", []):
+        if "K" not in packet.get("flags", ""):
+            continue
+        try:
+            frames.add(max(0, int(round((float(packet["pts_time"]) - start_time) * fps))))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return sorted(frames)
+
+def plan_keyframe_shards(total_frames: int, fps: float, workers: int, keyframes: List[int]) -> List[Tuple[int, int]]:
+    """將 [0, total_frames) 切成最多 workers 段，分段起點對齊到理想位置之後最近的關鍵畫格"""
+    min_shard_frames = max(1, int(KEYFRAME_MIN_SHARD_SECONDS * fps))
+    shard_count = max(1, min(workers, total_frames // min_shard_frames))
+    bounds = [0]
+    for i in range(1, shard_count):
+        ideal = total_frames * i // shard_count
+        idx = np.searchsorted(keyframes, ideal) if keyframes else 0
+        bound = keyframes[idx] if keyframes and idx < len(keyframes) else ideal
+        if bounds[-1] < bound < total_frames:
+            bounds.append(int(bound))
+    bounds.append(total_frames)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _scan_shard(video_path: str, threshold: float, start_frame: int, end_frame: int, is_last: bool,
+                stride: int, proxy_width: int, fast_dtype: bool, cancel_event=None):
+    """(子程序) 掃描單一分段，回傳屬於此分段的切點與清晰度分數；cancel_event 被設定時提前結束"""
+    video = scenedetect.open_video(video_path)
+    scan_start = max(0, start_frame - KEYFRAME_SHARD_WARMUP_FRAMES)
+    cuts, scores, actual_end = scan_scenes_and_sharpness(
+        video, threshold, start_frame=scan_start, end_frame=None if is_last else end_frame,
+        stride=stride, proxy_width=proxy_width, fast_dtype=fast_dtype,
+        should_cancel=cancel_event.is_set if cancel_event is not None else None,
+    )
+    owned_cuts = [c for c in cuts if start_frame <= c < actual_end and c > 0]
+    return start_frame, owned_cuts, scores[start_frame - scan_start:], actual_end
+
+def _write_shard_keyframes(video_path: str, output_dir: str, scenes: List[Tuple[int, int]], scores: np.ndarray,
+                           offset: int, fps: float, stride: int, proxy_width: int, fast_dtype: bool,
+                           cancel_event=None) -> int:
+    """(子程序) 為分配到的區段精修並寫出最佳影格，回傳寫入數量；cancel_event 被設定時提前結束"""
+    video = scenedetect.open_video(video_path)
+    written = 0
+    for start_frame, end_frame, _, best_frame in refine_best_frames(video, scenes, scores, offset, stride, proxy_width, fast_dtype):
+        if cancel_event is not None and cancel_event.is_set(): break
+        middle_frame_num = start_frame + (end_frame - start_frame) // 2
+        if write_keyframe(output_dir, middle_frame_num, fps, best_frame):
+            written += 1
+    return written
+
+def _wait_shard_futures(futures, should_cancel, cancel_event) -> list:
+    """等待所有子程序結果；期間 should_cancel() 回傳 True 時通知子程序停止並引發 PipelineCancelled"""
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+        if any(f.exception() is not None for f in done):
+            break
+        if should_cancel and should_cancel():
+            cancel_event.set()
+            for f in pending: f.cancel()
+            raise PipelineCancelled("已在擷取關鍵影格時取消。")
+    return [f.result() for f in futures]
+
+def _extract_keyframes_parallel(video_path: str, output_dir: str, threshold: float, workers: int,
+                                stride: int, proxy_width: int, fast_dtype: bool, should_cancel=None) -> bool:
+    """
+    依關鍵畫格將影片切成時間分段，以程序池平行進行場景偵測與清晰度評分，
+    再於主程序合併切點 (跨分段的場景自然接續) 後，平行寫出每個場景的最佳影格。
+    """
+    video = scenedetect.open_video(video_path)
+    fps = video.frame_rate
+    estimated_frames = video.duration.get_frames()
+    shards = plan_keyframe_shards(estimated_frames, fps, workers, probe_keyframe_frames(video_path, fps))
+    if len(shards) <= 1:
+        return False
+
+    print(f"平行模式：將影片切成 {len(shards)} 個分段，以 {workers} 個程序同時分析...")
+    # 呼叫端 (GUI 工作程序) 可能已有執行緒在跑，fork 會複製持有中的鎖而可能死結，因此一律以 spawn 啟動子程序
+    mp_context = multiprocessing.get_context("spawn")
+    with mp_context.Manager() as manager, ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        cancel_event = manager.Event()
+        futures = [
+            pool.submit(_scan_shard, video_path, threshold, s, e, i == len(shards) - 1, stride, proxy_width, fast_dtype,
+                        cancel_event)
+            for i, (s, e) in enumerate(shards)
+        ]
+        shard_results = _wait_shard_futures(futures, should_cancel, cancel_event)
+
+        total_frames = max(actual_end for _, _, _, actual_end in shard_results)
+        scores = np.full(total_frames, np.nan, dtype=np.float32)
+        cuts = set()
+        for start_frame, owned_cuts, shard_scores, _ in shard_results:
+            scores[start_frame:start_frame + len(shard_scores)] = shard_scores[:max(0, total_frames - start_frame)]
+            cuts.update(owned_cuts)
+
+        scene_list = scenes_from_cuts(sorted(cuts), 0, total_frames, fps)
+        print(f"分析 {len(scene_list)} 個區段以擷取最佳影格...")
+
+        # 依場景起點分配回各分段，分別精修並寫檔
+        groups = [[] for _ in shards]
+        shard_starts = [s for s, _ in shards]
+        for scene in scene_list:
+            groups[int(np.searchsorted(shard_starts, scene[0], side="right")) - 1].append(scene)
+        write_futures = []
+        for group in groups:
+            if not group: continue
+            lo, hi = group[0][0], group[-1][1]
+            write_futures.append(pool.submit(
+                _write_shard_keyframes, video_path, output_dir, group, scores[lo:hi], lo,
+                fps, stride, proxy_width, fast_dtype, cancel_event,
+            ))
+        written = sum(_wait_shard_futures(write_futures, should_cancel, cancel_event))
+    if not written:
+        print("  [警告] 平行模式未寫出任何關鍵影格，改以單程序重新擷取。")
+        return False
+    print(f"  - 已寫出 {written} 張關鍵影格。")
+    return True
+
+def step1_extract_keyframes(video_path: str, output_dir: str, threshold: float = 27.0,
+                            stride: int = None, proxy_width: int = None, fast_dtype: bool = None,
+                            workers: int = None, should_cancel=None):
     print("\n" + "="*50)
     print("--- 步驟 1: 分析影片並擷取關鍵影格 ---")
     print("="*50)
     os.makedirs(output_dir, exist_ok=True)
     try:
+        stride = SHARPNESS_FRAME_STRIDE if stride is None else stride
+        proxy_width = SHARPNESS_PROXY_WIDTH if proxy_width is None else proxy_width
+        fast_dtype = SHARPNESS_FAST_DTYPE if fast_dtype is None else fast_dtype
+        workers = KEYFRAME_EXTRACTION_WORKERS if workers is None else workers
+
+        if workers > 1 and _extract_keyframes_parallel(video_path, output_dir, threshold, workers, stride, proxy_width, fast_dtype,
+                                                       should_cancel):
+            print("\n[成功] 步驟 1 完成！")
+            return True
+
         video = scenedetect.open_video(video_path)
-        scene_manager = scenedetect.SceneManager()
-        scene_manager.add_detector(ContentDetector(threshold=threshold))
-        scene_manager.detect_scenes(video=video)
-        scene_list = scene_manager.get_scene_list()
         fps = video.frame_rate
-        if not scene_list:
-            print("[警告] 在影片中偵測不到場景變化，將以固定間隔取樣。")
-            duration_sec = video.duration.get_seconds()
-            scene_list = [(video.base_timecode + (i*fps*5), video.base_timecode + ((i+1)*fps*5)) for i in range(int(duration_sec/5))]
-        
+        print(f"單次解碼：同時偵測場景並計算清晰度 (每 {max(1, stride)} 幀評分, 代理寬度 {proxy_width or '原始'}, 快速型別 {fast_dtype})...")
+        cuts, scores, total_frames = scan_scenes_and_sharpness(
+            video, threshold, stride=stride, proxy_width=proxy_width, fast_dtype=fast_dtype, should_cancel=should_cancel
+        )
+        scene_list = scenes_from_cuts(cuts, 0, total_frames, fps)
+
         print(f"分析 {len(scene_list)} 個區段以擷取最佳影格...")
-        for _, (start_tc, end_tc) in enumerate(scene_list):
-            start_frame, end_frame = start_tc.get_frames(), end_tc.get_frames()
-            if start_frame >= end_frame: continue
-            
-            best_frame, max_sharpness = None, -1
-            video.seek(start_frame)
-            for _ in range(end_frame - start_frame):
-                frame = video.read()
-                if frame is None: break
-                sharpness = calculate_sharpness(frame)
-                if sharpness > max_sharpness:
-                    max_sharpness, best_frame = sharpness, frame.copy()
-            if best_frame is not None:
-                middle_frame_num = start_frame + (end_frame - start_frame) // 2
-                total_millis = int((middle_frame_num / fps) * 1000)
-                minutes, seconds, millis = total_millis // 60000, (total_millis % 60000) // 1000, total_millis % 1000
-                filename = f"{minutes:02d}-{seconds:02d}-{millis:03d}.jpg"
-                imwrite_unicode(os.path.join(output_dir, filename), best_frame)
+        for start_frame, end_frame, _, best_frame in refine_best_frames(video, scene_list, scores, 0, stride, proxy_width, fast_dtype):
+            middle_frame_num = start_frame + (end_frame - start_frame) // 2
+            write_keyframe(output_dir, middle_frame_num, fps, best_frame)
+    except PipelineCancelled:
+        raise
     except Exception as e:
         print(f"[嚴重錯誤] 擷取關鍵影格時發生錯誤: {e}")
         return False
     print("\n[成功] 步驟 1 完成！")
     return True
 
-def step2_generate_initial_descriptions(api_key, image_dir, video_summary, video_duration, nonspeech_segments):
-    print("\n" + "="*50)
-    print("--- 步驟 2: AI 生成初步描述 ---")
-    print("="*50)
-    
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
+class KeyframeFeed:
+    """
+    步驟 1 → 步驟 2 的關鍵影格清單 (執行緒安全)，項目為 (檔名, 開始時間)。
+    擷取端以 put() 逐張加入、結束時 close()；描述端以 wait_for() 等待指定索引的影格出現。
+    """
+    def __init__(self, items: Sequence[Tuple[str, float]] = None):
+        self._items = list(items or [])
+        self.closed = items is not None
+        self.cancelled = False
+        self._cond = threading.Condition()
+
+    def put(self, filename: str, start_time: float) -> None:
+        with self._cond:
+            self._items.append((filename, start_time))
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def cancel(self) -> None:
+        """描述端中止時通知擷取端停止"""
+        self.cancelled = True
+        self.close()
+
+    def wait_for(self, index: int) -> bool:
+        """等待第 index 張影格出現；清單已結束且沒有該影格時回傳 False"""
+        with self._cond:
+            self._cond.wait_for(lambda: index < len(self._items) or self.closed)
+            return index < len(self._items)
+
+    def __getitem__(self, index: int) -> Tuple[str, float]:
+        with self._cond:
+            return self._items[index]
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+def load_keyframe_feed(image_dir: str):
+    """讀取目錄中已寫好的關鍵影格 (mm-ss-mmm.jpg)，回傳已結束的 KeyframeFeed；失敗時回傳 None"""
     try:
         image_files_all = sorted([f for f in os.listdir(image_dir) if f.lower().endswith('.jpg')])
     except FileNotFoundError:
@@ -220,73 +877,360 @@ def step2_generate_initial_descriptions(api_key, image_dir, video_summary, video
         print("[警告] 影格目錄中沒有圖片")
         return None
 
-    start_times, image_files = [], []
+    items = []
     for filename in image_files_all:
         try:
             base_name = os.path.splitext(filename)[0]
             parts = base_name.split('-')
             if len(parts) == 3:
                 start_time = int(parts[0]) * 60 + int(parts[1]) + int(parts[2]) / 1000.0
-                start_times.append(start_time)
-                image_files.append(filename)
+                items.append((filename, start_time))
             else:
                 print(f"  [警告] 發現不合格式的檔名，已跳過：{filename}")
         except (ValueError, IndexError):
             print(f"  [警告] 解析檔名 {filename} 失敗，已跳過。")
 
-    if not image_files:
+    if not items:
         print("[錯誤] 所有關鍵影格的檔名格式都不正確，無法繼續。")
         return None
+    return KeyframeFeed(items)
+
+def stream_keyframes(video, fetch_video, threshold: float, stride: int = 1, proxy_width: int = 0, fast_dtype: bool = False,
+                     should_cancel=None):
+    """
+    單次解碼並邊掃描邊產生關鍵影格：偵測到切點時，前一個場景的最佳影格即已確定。
+    產生 (區段起始, 區段結束, 最佳影格, 影格影像)，結果與 scan_scenes_and_sharpness + scenes_from_cuts
+    + refine_best_frames 相同。掃描時只保留目前場景的清晰度分數，場景結束後才由 fetch_video
+    (同一影片的另一個讀取器) 讀回最佳影格，不在記憶體中累積影格。
+    第一個切點出現前無法得知整部影片是否有切點，因此開頭的場景要等到第一個切點才產生；
+    影片結束時仍沒有任何切點，則與 scenes_from_cuts 相同改以每 5 秒固定間隔取樣。
+    """
+    stride = max(1, stride)
+    fps = video.frame_rate
+    detector = ContentDetector(threshold=threshold)
+    downscale = compute_downscale_factor(video.frame_size[0])
+    scores = []  # 自 scene_start 起每一幀的分數 (未評分為 NaN)
+    scene_start, frame_num = 0, 0
+
+    def close_scenes(scenes):
+        nonlocal scores, scene_start
+        end = scenes[-1][1]
+        scene_scores = np.asarray(scores[:end - scene_start], dtype=np.float32)
+        offset, scene_start = scene_start, end
+        del scores[:end - offset]
+        return refine_best_frames(fetch_video, scenes, scene_scores, offset, stride, proxy_width, fast_dtype)
+
+    while True:
+        if frame_num % CANCEL_CHECK_FRAMES == 0:
+            raise_if_cancelled(should_cancel)
+        frame = video.read()
+        if frame is None or frame is False: break
+        detect_frame = frame
+        if downscale > 1:
+            h, w = frame.shape[:2]
+            detect_frame = cv2.resize(frame, (w // downscale, h // downscale), interpolation=cv2.INTER_AREA)
+        cuts = sorted({int(c) for c in detector.process_frame(frame_num, detect_frame) if scene_start < c <= frame_num})
+        scores.append(calculate_sharpness(frame, proxy_width, fast_dtype) if frame_num % stride == 0 else np.nan)
+        frame_num += 1
+        for cut in cuts:
+            yield from close_scenes([(scene_start, cut)])
+
+    cuts = sorted({int(c) for c in detector.post_process(frame_num) if scene_start < c < frame_num})
+    if scene_start == 0 and not cuts:
+        scenes = scenes_from_cuts([], 0, frame_num, fps)
+        if scenes:
+            yield from close_scenes(scenes)
+        return
+    for cut in cuts + [frame_num]:
+        yield from close_scenes([(scene_start, cut)])
+
+def step1_extract_keyframes_streaming(video_path: str, output_dir: str, feed: KeyframeFeed, threshold: float = 27.0,
+                                      stride: int = None, proxy_width: int = None, fast_dtype: bool = None,
+                                      should_cancel=None) -> bool:
+    """
+    串流版步驟 1：每確定一個場景的最佳影格就寫檔並放入 feed，讓步驟 2 立即開始描述。
+    結束 (或失敗) 時關閉 feed；feed 被步驟 2 取消或 should_cancel() 回傳 True 時提前停止。
+    """
+    print("\n" + "="*50)
+    print("--- 步驟 1: 分析影片並擷取關鍵影格 (串流) ---")
+    print("="*50)
+    os.makedirs(output_dir, exist_ok=True)
+    written = 0
+    try:
+        stride = SHARPNESS_FRAME_STRIDE if stride is None else stride
+        proxy_width = SHARPNESS_PROXY_WIDTH if proxy_width is None else proxy_width
+        fast_dtype = SHARPNESS_FAST_DTYPE if fast_dtype is None else fast_dtype
+        video = scenedetect.open_video(video_path)
+        fetch_video = scenedetect.open_video(video_path)
+        fps = video.frame_rate
+        stopped = lambda: feed.cancelled or bool(should_cancel and should_cancel())
+        for start_frame, end_frame, _, best_frame in stream_keyframes(video, fetch_video, threshold, stride, proxy_width,
+                                                                      fast_dtype, should_cancel=stopped):
+            raise_if_cancelled(stopped)
+            middle_frame_num = start_frame + (end_frame - start_frame) // 2
+            if write_keyframe(output_dir, middle_frame_num, fps, best_frame):
+                feed.put(keyframe_filename(middle_frame_num, fps), int((middle_frame_num / fps) * 1000) / 1000.0)
+                written += 1
+    except PipelineCancelled:
+        print("  - 流程已取消或後續步驟已中止，停止擷取關鍵影格。")
+        return False
+    except Exception as e:
+        print(f"[嚴重錯誤] 擷取關鍵影格時發生錯誤: {e}")
+        return False
+    finally:
+        feed.close()
+    print(f"  - 已寫出 {written} 張關鍵影格。")
+    print("\n[成功] 步驟 1 完成！")
+    return True
 
-    descriptions_data, previous_description = [], "這是影片的開頭。"
+def _format_mmss(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes:02d}:{secs:02d}"
+
+def build_description_prompt(video_summary: str, previous_description: str, max_chars: int) -> str:
+    return (
+        f"你是一位專業的口述影像撰寫者，任務是為影片的關鍵畫面生成連貫的描述。\n\n"
+        f"【影片整體摘要】:\n{video_summary.strip()}\n\n"
+        f"【前一個畫面的描述】:\n{previous_description}\n\n"
+        f"【你的任務】:\n請依據上下文，專注描述下方圖片的內容。生成一句客觀、具體的口述影像。\n\n"
+        f"【絕對規則】\n這句描述的中文總字數【絕對不能超過 {max_chars} 個字】。請嚴格遵守此限制。"
+    )
+
+def build_batch_description_prompt(video_summary: str, previous_description: str,
+                                   frames: Sequence[Tuple[float, float, int]]) -> str:
+    """frames 為 (開始時間, 可用秒數, 字數上限)，依序對應請求中附上的圖片"""
+    frame_lines = "\n".join(
+        f"畫面 {n}：時間 {_format_mmss(start)}，可用 {duration:.1f} 秒，字數上限 {max_chars} 字"
+        for n, (start, duration, max_chars) in enumerate(frames, 1)
+    )
+    return (
+        f"你是一位專業的口述影像撰寫者，任務是為影片中連續的 {len(frames)} 個關鍵畫面生成連貫的描述。\n\n"
+        f"【影片整體摘要】:\n{video_summary.strip()}\n\n"
+        f"【這組畫面之前的描述】:\n{previous_description}\n\n"
+        f"【畫面清單】(圖片依相同順序附在下方):\n{frame_lines}\n\n"
+        f"【你的任務】:\n請依時間順序，為每個畫面各生成一句客觀、具體的口述影像，前後描述需連貫。\n\n"
+        f"【絕對規則】\n1. 每句描述的中文總字數【絕對不能超過該畫面的字數上限】。\n"
+        f"2. 只輸出 JSON 陣列，不要任何其他文字，格式為："
+        f'[{{"frame": 1, "description": "..."}}, {{"frame": 2, "description": "..."}}]'
+    )
+
+def parse_batch_descriptions(text: str, count: int) -> Dict[int, str]:
+    """
+    解析批次請求回傳的 JSON，回傳 {畫面索引 (從 0 起算): 描述}。
+    格式錯誤、索引超出範圍或描述為空的項目不會出現在結果中，由呼叫端改以單張請求補上。
+    """
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict): continue
+        frame, description = item.get("frame"), item.get("description")
+        if not isinstance(frame, int) or not 1 <= frame <= count or frame - 1 in parsed: continue
+        if not isinstance(description, str) or not description.strip(): continue
+        parsed[frame - 1] = description.strip().replace('\n', ' ')
+    return parsed
+
+def step2_generate_initial_descriptions(api_key, image_dir, video_summary, video_duration, nonspeech_segments,
+                                        model=None, max_workers: int = None, rate_limiter: AdaptiveRateLimiter = None,
+                                        cache: GeminiResponseCache = None, frames_per_request: int = None,
+                                        keyframes: "KeyframeFeed" = None, should_cancel=None):
+    """
+    以有限並行度為每張關鍵影格生成描述。
+    關鍵影格依時間切成 max_workers 條連續的描述鏈，鏈內依序處理，因此每個請求仍能拿到前一張影格的描述；
+    每條鏈的第一個請求 (影片開頭除外) 拿不到前一條鏈的描述，改為附上前一張關鍵影格的圖片作為上下文。
+    model 可傳入任何具有 generate_content() 的物件 (例如測試用的假模型)。
+    cache 預設使用 get_gemini_cache()；命中時直接回傳先前的描述，不呼叫 API。
+    frames_per_request > 1 時，鏈內每 K 張影格合併為一次請求；解析失敗的影格再個別補送。
+    keyframes 為步驟 1 的 KeyframeFeed 時可邊擷取邊描述；未指定時讀取 image_dir 中已寫好的影格。
+    nonspeech_segments 可為可呼叫物件，會在第一次需要計算字數上限時才取得 (例如等待人聲偵測完成)。
+    每次送出請求前檢查 should_cancel()，回傳 True 時停止所有描述鏈並引發 PipelineCancelled。
+    """
+    print("\n" + "="*50)
+    print("--- 步驟 2: AI 生成初步描述 ---")
+    print("="*50)
+    
+    if model is None:
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    model_name = getattr(model, "model_name", GEMINI_MODEL_NAME)
+    cache = cache if cache is not None else get_gemini_cache()
+    hits_before, misses_before = (cache.hits, cache.misses) if cache else (0, 0)
+    max_workers = max(1, max_workers or GEMINI_MAX_CONCURRENCY)
+    frames_per_request = max(1, frames_per_request or GEMINI_FRAMES_PER_REQUEST)
+    rate_limiter = rate_limiter or AdaptiveRateLimiter()
+    
+    if keyframes is None:
+        keyframes = load_keyframe_feed(image_dir)
+        if keyframes is None: return None
 
     def compute_max_chars(start_time, end_time):
-        for ns_start, ns_end in nonspeech_segments:
+        segments = nonspeech_segments() if callable(nonspeech_segments) else nonspeech_segments
+        for ns_start, ns_end in segments:
             if ns_start <= start_time < ns_end:
                 available_duration = min(ns_end, end_time) - start_time
                 return max(8, int(available_duration / SECONDS_PER_CHAR))
         return 8
 
-    for i, filename in enumerate(image_files):
-        ideal_start_time = start_times[i]
-        end_boundary = start_times[i + 1] if i + 1 < len(start_times) else video_duration
-        max_chars = compute_max_chars(ideal_start_time, end_boundary)
-        print(f"  處理中 ({i+1}/{len(image_files)}): {filename} (可用 {end_boundary - ideal_start_time:.2f}s, 上限 {max_chars} 字)")
-        try:
-            image_path = os.path.join(image_dir, filename)
-            with Image.open(image_path) as img:
-                prompt_parts = [
-                    f"你是一位專業的口述影像撰寫者，任務是為影片的關鍵畫面生成連貫的描述。\n\n"
-                    f"【影片整體摘要】:\n{video_summary.strip()}\n\n"
-                    f"【前一個畫面的描述】:\n{previous_description}\n\n"
-                    f"【你的任務】:\n請依據上下文，專注描述下方圖片的內容。生成一句客觀、具體的口述影像。\n\n"
-                    f"【絕對規則】\n這句描述的中文總字數【絕對不能超過 {max_chars} 個字】。請嚴格遵守此限制。",
-                    img
-                ]
-                response = handle_api_call(model, prompt_parts)
-            
-            if not response: continue
+    results = {}
+    abort = threading.Event()
+
+    def stopped() -> bool:
+        if should_cancel and should_cancel():
+            abort.set()
+        return abort.is_set()
+
+    def label(i):
+        return f"{i+1}/{len(keyframes) if keyframes.closed else '?'}"
+
+    def frame_window(i):
+        ideal_start_time = keyframes[i][1]
+        end_boundary = keyframes[i + 1][1] if keyframes.wait_for(i + 1) else video_duration
+        return ideal_start_time, end_boundary - ideal_start_time, compute_max_chars(ideal_start_time, end_boundary)
+
+    def make_item(i, text):
+        ideal_start_time, available_duration, max_chars = frame_window(i)
+        print(f"    -> ({label(i)}) 生成描述: {text}")
+        return {
+            "ideal_start_time": ideal_start_time, "text": text,
+            "available_duration": available_duration, "max_chars": max_chars
+        }
+
+    def context_parts(stack, context_image):
+        """前一張關鍵影格的圖片 (僅作上下文)；沒有時回傳空串列"""
+        if not context_image: return []
+        return ["前一個畫面 (僅供銜接參考，不需描述)：", stack.enter_context(Image.open(context_image))]
+
+    def describe(i, previous_description, context_image=None):
+        filename = keyframes[i][0]
+        _, available_duration, max_chars = frame_window(i)
+        print(f"  處理中 ({label(i)}): {filename} (可用 {available_duration:.2f}s, 上限 {max_chars} 字)")
+        image_path = os.path.join(image_dir, filename)
+        prompt_text = build_description_prompt(video_summary, previous_description, max_chars)
+        cache_key = None
+        if cache:
+            image_hashes = ",".join(compute_file_sha256(p) for p in filter(None, [context_image, image_path]))
+            cache_key = cache.make_key(model_name, prompt_text, image_hashes, max_chars)
+            current_description = cache.get(cache_key)
+        if not cache_key or current_description is None:
+            with ExitStack() as stack:
+                prompt_parts = [prompt_text] + context_parts(stack, context_image)
+                if context_image: prompt_parts.append("本畫面：")
+                prompt_parts.append(stack.enter_context(Image.open(image_path)))
+                response = handle_api_call(model, prompt_parts, rate_limiter=rate_limiter)
+            if not response: return None
             current_description = response.text.strip().replace('\n', ' ')
-            previous_description = current_description
-            descriptions_data.append({
-                "ideal_start_time": ideal_start_time, "text": current_description,
-                "available_duration": end_boundary - ideal_start_time, "max_chars": max_chars
-            })
-            print(f"    -> 生成描述: {current_description}")
-            time.sleep(2)
-        except NotFound as e:
-             print(f"    [嚴重錯誤] Google API 錯誤: {e}")
-             print(f"    -> 請確認您的 API 金鑰是否正確，以及 'gemini-2.5-flash' 模型是否可用。")
-             return None
-        except Exception as e:
-            print(f"    [嚴重錯誤] 處理 {filename} 時發生錯誤: {e}")
-            traceback.print_exc()
-            continue
-            
+            if cache_key: cache.put(cache_key, current_description)
+        return make_item(i, current_description)
+
+    def describe_batch(indices, previous_description, context_image=None) -> Dict[int, str]:
+        """一次請求描述多張影格，回傳成功解析的 {影格索引: 描述}"""
+        frames = [frame_window(i) for i in indices]
+        print(f"  批次處理中 ({indices[0]+1}-{label(indices[-1])}): {len(indices)} 張影格")
+        image_paths = [os.path.join(image_dir, keyframes[i][0]) for i in indices]
+        prompt_text = build_batch_description_prompt(video_summary, previous_description, frames)
+        cache_key, response_text = None, None
+        if cache:
+            cache_key = cache.make_key(model_name, prompt_text,
+                                       ",".join(compute_file_sha256(p) for p in filter(None, [context_image] + image_paths)),
+                                       ",".join(str(max_chars) for _, _, max_chars in frames))
+            response_text = cache.get(cache_key)
+        if response_text is None:
+            with ExitStack() as stack:
+                prompt_parts = [prompt_text] + context_parts(stack, context_image)
+                for n, path in enumerate(image_paths, 1):
+                    prompt_parts += [f"畫面 {n}：", stack.enter_context(Image.open(path))]
+                response = handle_api_call(model, prompt_parts, rate_limiter=rate_limiter)
+            if not response: return {}
+            response_text = response.text
+        parsed = parse_batch_descriptions(response_text, len(indices))
+        if cache_key and parsed: cache.put(cache_key, response_text)
+        if len(parsed) < len(indices):
+            print(f"    [警告] 批次回應中有 {len(indices) - len(parsed)} 張影格無法解析，將改為個別請求。")
+        return {indices[n]: text for n, text in parsed.items()}
+
+    def report_not_found(e):
+        print(f"    [嚴重錯誤] Google API 錯誤: {e}")
+        print(f"    -> 請確認您的 API 金鑰是否正確，以及 '{GEMINI_MODEL_NAME}' 模型是否可用。")
+        abort.set()
+
+    def run_chain(first, last):
+        # 前一條鏈與本鏈同時進行，拿不到它的最後一句描述；改附上前一張關鍵影格，直到本鏈產生第一句描述為止
+        context_image = None
+        if first == 0:
+            previous_description = "這是影片的開頭。"
+        else:
+            previous_description = (f"（前一個畫面約在 {_format_mmss(keyframes[first - 1][1])}，尚無文字描述；"
+                                    f"其圖片附在最前面，請據此銜接。）")
+            context_image = os.path.join(image_dir, keyframes[first - 1][0])
+        for group_start in range(first, last, frames_per_request):
+            if stopped(): return
+            group = []
+            for i in range(group_start, min(group_start + frames_per_request, last)):
+                if not keyframes.wait_for(i): break
+                group.append(i)
+            if not group: return
+            batch_texts = {}
+            if len(group) > 1:
+                try:
+                    batch_texts = describe_batch(group, previous_description, context_image)
+                except NotFound as e:
+                    report_not_found(e)
+                    return
+                except Exception as e:
+                    print(f"    [警告] 批次請求失敗，將改為個別請求: {e}")
+            for i in group:
+                if stopped(): return
+                try:
+                    item = make_item(i, batch_texts[i]) if i in batch_texts else describe(i, previous_description, context_image)
+                except NotFound as e:
+                    report_not_found(e)
+                    return
+                except Exception as e:
+                    print(f"    [嚴重錯誤] 處理 {keyframes[i][0]} 時發生錯誤: {e}")
+                    traceback.print_exc()
+                    continue
+                if item:
+                    results[i] = item
+                    previous_description, context_image = item["text"], None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        if keyframes.closed:
+            total = len(keyframes)
+            chain_count = min(max_workers, total)
+            bounds = [total * k // chain_count for k in range(chain_count + 1)]
+            print(f"以 {chain_count} 條並行描述鏈處理 {total} 張關鍵影格 (每次請求 {frames_per_request} 張)...")
+            futures = [pool.submit(run_chain, bounds[k], bounds[k + 1]) for k in range(chain_count)]
+        else:
+            # 串流模式：總數未知，每湊到一段 GEMINI_STREAM_CHAIN_LENGTH 張的起點就開一條新的描述鏈
+            print(f"串流模式：關鍵影格產生後即送出描述請求 (最多 {max_workers} 條並行描述鏈)...")
+            futures, first = [], 0
+            while not stopped() and keyframes.wait_for(first):
+                futures.append(pool.submit(run_chain, first, first + GEMINI_STREAM_CHAIN_LENGTH))
+                first += GEMINI_STREAM_CHAIN_LENGTH
+        for future in futures:
+            future.result()
+
+    if abort.is_set():
+        keyframes.cancel()
+        raise_if_cancelled(should_cancel)
+        return None
+    if not results:
+        print("[警告] 沒有任何關鍵影格可供描述。")
+        return None
+
+    if cache:
+        print(f"[快取] 步驟 2：命中 {cache.hits - hits_before} 次，未命中 {cache.misses - misses_before} 次。")
+    descriptions_data = [results[i] for i in sorted(results)]
     print(f"\n[成功] 步驟 2 完成！已生成 {len(descriptions_data)} 條初步描述。")
     return descriptions_data
 
-def step3_refine_and_merge_descriptions(api_key, initial_data, video_summary, nonspeech_segments):
+def step3_refine_and_merge_descriptions(api_key, initial_data, video_summary, nonspeech_segments,
+                                        cache: GeminiResponseCache = None):
     print("\n" + "="*50)
     print("--- 步驟 3: AI 精煉與智慧合併描述 ---")
     print("="*50)
@@ -308,9 +1252,8 @@ def step3_refine_and_merge_descriptions(api_key, initial_data, video_summary, no
         
         raw_text_for_prompt += f"{minutes:02d}:{remainder:02d}:{ms:03d}: {item['text']} (字數上限: {max_chars} 字)\n"
 
+    cache = cache if cache is not None else get_gemini_cache()
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash') 
         prompt = f"""
 你是一位頂尖的口述影像編輯師，請參考【影片整體摘要】，將下方的【原始描述】進行專業級的優化。
 【核心任務】
@@ -325,11 +1268,19 @@ def step3_refine_and_merge_descriptions(api_key, initial_data, video_summary, no
 【原始描述】:
 {raw_text_for_prompt}
 """
-        print("正在呼叫 AI 進行智慧合併與精煉...")
-        response = handle_api_call(model, prompt)
-        if not response: raise Exception("AI 精煉步驟的 API 呼叫失敗。")
+        cache_key = cache.make_key(GEMINI_MODEL_NAME, prompt) if cache else None
+        refined_text_from_ai = cache.get(cache_key) if cache_key else None
+        if refined_text_from_ai is not None:
+            print("[快取] 步驟 3：命中，略過 AI 精煉呼叫。")
+        else:
+            if cache_key: print("[快取] 步驟 3：未命中。")
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+            print("正在呼叫 AI 進行智慧合併與精煉...")
+            response = handle_api_call(model, prompt)
+            if not response: raise Exception("AI 精煉步驟的 API 呼叫失敗。")
+            refined_text_from_ai = response.text.strip()
         
-        refined_text_from_ai = response.text.strip()
         refined_descriptions = []
         pattern = re.compile(r"^\s*(\d{2}):(\d{2}):(\d{3})\s*[:\-]?\s*(.+)")
         for line in refined_text_from_ai.split('\n'):
@@ -342,6 +1293,7 @@ def step3_refine_and_merge_descriptions(api_key, initial_data, video_summary, no
         if not refined_descriptions and refined_text_from_ai:
             print("[警告] AI 回應的格式不符合預期，將使用步驟2的原始描述。")
             return initial_data
+        if cache_key: cache.put(cache_key, refined_text_from_ai)
 
         print(f"AI 精煉完成！描述數量從 {len(initial_data)} 條優化為 {len(refined_descriptions)} 條。")
         print("\n[成功] 步驟 3 完成！")
@@ -353,118 +1305,476 @@ def step3_refine_and_merge_descriptions(api_key, initial_data, video_summary, no
         print("[警告] 步驟3失敗，將使用步驟2的原始描述繼續。")
         return initial_data
 
-async def _run_tts_tasks(descriptions):
-    semaphore = asyncio.Semaphore(5)
-
-    async def safe_tts_task(desc, index):
-        async with semaphore:
+def get_tts_cache_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", TTS_CACHE_DIRNAME)
+
+class AdaptiveConcurrencyLimiter:
+    """
+    asyncio 版的 AIMD 併發控制：
+    遇到 429 / 5xx 時併發數減半，延遲超過目標時減一，連續成功達目前併發數時加一。
+    """
+    def __init__(self, initial: int = TTS_INITIAL_CONCURRENCY, minimum: int = 1, maximum: int = TTS_MAX_CONCURRENCY,
+                 latency_target: float = TTS_LATENCY_TARGET):
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self, throttled: bool = False, latency: float = None):
+        async with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._successes = 0
+            elif latency is not None and latency > self.latency_target:
+                self.limit = max(self.minimum, self.limit - 1)
+                self._successes = 0
+            elif latency is not None:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self._successes = 0
+            self._cond.notify_all()
+
+def _tts_backoff(attempt: int, retry_after: float = None) -> float:
+    """指數退避 + full jitter；伺服器有給 Retry-After 時以其為下限"""
+    delay = random.uniform(0, min(TTS_BACKOFF_MAX, TTS_BACKOFF_BASE * (2 ** attempt)))
+    return max(delay, retry_after or 0.0)
+
+async def _run_tts_tasks(descriptions, cache_dir, synthesize=None, limiter: AdaptiveConcurrencyLimiter = None,
+                         max_attempts: int = TTS_MAX_ATTEMPTS, should_cancel=None):
+    """
+    以自適應併發合成所有句子，結果寫回 desc['audio_path'] / desc['audio_duration']。
+    可重試的錯誤 (連線失敗、429、5xx) 會以抖動退避重試；主要階段失敗的句子最後再以單線逐句重試一輪。
+    synthesize 可替換為測試用的假實作 (簽名同 synthesize_speech_cached_async)。
+    每次嘗試前檢查 should_cancel()，回傳 True 時尚未開始的句子不再送出。
+    回傳統計資料 dict。
+    """
+    synthesize = synthesize or synthesize_speech_cached_async
+    limiter = limiter or AdaptiveConcurrencyLimiter()
+    stats = {"hits": 0, "synthesized": 0, "retries": 0, "latencies": []}
+
+    async def attempt_line(desc, index, attempts, gate):
+        for attempt in range(attempts):
+            if should_cancel and should_cancel(): return False
+            await gate.acquire()
+            started = time.monotonic()
+            throttled, latency = False, None
             try:
-                print(f"  - (TTS 任務 {index}) 開始生成: '{desc['text'][:20]}...'")
-                await synthesize_speech_to_file_async(
+                desc['audio_path'], desc['audio_duration'], hit = await synthesize(
                     desc['text'],
                     VOICE,
-                    desc['audio_path'],
+                    cache_dir,
                     speech_rate=1.0,
                     language=VOICE_LOCALE,
                 )
+                latency = time.monotonic() - started
+                stats["hits" if hit else "synthesized"] += 1
+                if not hit:
+                    stats["latencies"].append(latency)
+                    print(f"  - (TTS 任務 {index}) 完成，耗時 {latency:.2f} 秒 (第 {attempt + 1} 次嘗試，併發上限 {gate.limit})")
+                return True
+            except AzureTTSHTTPError as e:
+                throttled = e.status_code == 429 or (e.status_code or 0) >= 500
+                if not e.retryable or attempt + 1 >= attempts:
+                    print(f"  - [警告] (TTS 任務 {index}) 生成失敗 (Azure): '{desc['text'][:20]}...'。錯誤: {e}")
+                    return False
+                delay = _tts_backoff(attempt, e.retry_after)
+                print(f"  - (TTS 任務 {index}) {e}，{delay:.1f} 秒後重試 (第 {attempt + 1} 次)")
             except AzureTTSException as e:
                 print(f"  - [警告] (TTS 任務 {index}) 生成失敗 (Azure): '{desc['text'][:20]}...'。錯誤: {e}")
+                return False
             except Exception as e:
-                print(f"  - [警告] (TTS 任務 {index}) 生成失敗: '{desc['text'][:20]}...'。錯誤: {e}")
+                if attempt + 1 >= attempts:
+                    print(f"  - [警告] (TTS 任務 {index}) 生成失敗: '{desc['text'][:20]}...'。錯誤: {e}")
+                    return False
+                delay = _tts_backoff(attempt)
+                print(f"  - (TTS 任務 {index}) 發生錯誤: {e}，{delay:.1f} 秒後重試 (第 {attempt + 1} 次)")
+            finally:
+                await gate.release(throttled=throttled, latency=latency)
+            stats["retries"] += 1
+            await asyncio.sleep(delay)
+        return False
 
-    tasks = [safe_tts_task(desc, i + 1) for i, desc in enumerate(descriptions)]
-    await asyncio.gather(*tasks)
+    results = await asyncio.gather(*[attempt_line(desc, i + 1, max_attempts, limiter) for i, desc in enumerate(descriptions)])
+    failed = [i for i, ok in enumerate(results) if not ok]
+    if failed and not (should_cancel and should_cancel()):
+        print(f"  - {len(failed)} 句在主要階段失敗，改以單線逐句重試...")
+        serial = AdaptiveConcurrencyLimiter(initial=1, maximum=1)
+        for i in failed:
+            await attempt_line(descriptions[i], i + 1, max_attempts, serial)
+    return stats
 
-def step4_generate_audio_and_measure_duration(descriptions):
+def step4_generate_audio_and_measure_duration(descriptions, should_cancel=None):
     print("\n" + "="*50)
     print("--- 步驟 4: 生成語音並測量時長 ---")
     print("="*50)
     if not descriptions: return None
 
-    global TEMP_AUDIO_DIR
-    os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
-    for i, desc in enumerate(descriptions):
-        desc['audio_path'] = os.path.join(TEMP_AUDIO_DIR, f"narration_{i}.mp3")
+    cache_dir = get_tts_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    for desc in descriptions:
+        desc.pop('audio_path', None)
+        desc.pop('audio_duration', None)
     
-    print("開始並行生成所有語音檔...")
+    print("開始並行生成所有語音檔 (已合成過的句子直接使用快取)...")
     try:
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(_run_tts_tasks(descriptions))
+        stats = loop.run_until_complete(_run_tts_tasks(descriptions, cache_dir, should_cancel=should_cancel))
+        print(f"[快取] 步驟 4：命中 {stats['hits']} 句，合成 {stats['synthesized']} 句，重試 {stats['retries']} 次。")
+        if stats["latencies"]:
+            latencies = np.sort(stats["latencies"])
+            print(f"  - 合成耗時：平均 {latencies.mean():.2f} 秒，P95 {latencies[int(0.95 * (len(latencies) - 1))]:.2f} 秒，"
+                  f"最長 {latencies[-1]:.2f} 秒")
     except Exception as e:
         print(f"  [嚴重錯誤] 非同步任務執行時發生未知錯誤: {e}")
+    raise_if_cancelled(should_cancel)
 
-    print("所有語音檔生成完畢！\n正在測量每個語音檔的實際長度...")
     successful_descriptions = []
-    for desc in descriptions:
-        try:
-            if os.path.exists(desc['audio_path']):
-                audio = MP3(desc['audio_path'])
-                desc['audio_duration'] = audio.info.length
-                print(f"  - {os.path.basename(desc['audio_path'])}: {desc['audio_duration']:.2f} 秒")
-                successful_descriptions.append(desc)
-            else:
-                print(f"  - [跳過] {os.path.basename(desc['audio_path'])} 因生成失敗而無法測量。")
-        except Exception as e:
-            desc['audio_duration'] = 0.0
-            print(f"  - [錯誤] 測量 {os.path.basename(desc['audio_path'])} 時長失敗: {e}")
+    for i, desc in enumerate(descriptions):
+        if 'audio_path' not in desc or not os.path.exists(desc['audio_path']):
+            print(f"  - [跳過] 第 {i+1} 句因生成失敗而沒有語音檔。")
+            continue
+        if desc.get('audio_duration') is None:
+            # 輸出格式無法由大小推算長度時才解析 MP3
+            try:
+                desc['audio_duration'] = MP3(desc['audio_path']).info.length
+            except Exception as e:
+                print(f"  - [錯誤] 測量第 {i+1} 句語音長度失敗: {e}")
+                continue
+        print(f"  - 第 {i+1} 句: {desc['audio_duration']:.2f} 秒")
+        successful_descriptions.append(desc)
             
     print(f"\n[成功] 步驟 4 完成！成功生成並測量了 {len(successful_descriptions)} 個語音檔。")
     return successful_descriptions
 
-def step5_plan_timeline(descriptions, video_duration, non_dialogue_segments):
+def _fit_in_segment(start: float, seg_end: float, audio_duration: float):
+    """回傳 (加速倍率, 實際長度)；放不下時回傳 None"""
+    available_duration = seg_end - start
+    if available_duration >= audio_duration:
+        return 1.0, audio_duration
+    if available_duration > 0.5 and (audio_duration / available_duration) <= MAX_SPEEDUP_FACTOR:
+        return audio_duration / available_duration, available_duration
+    return None
+
+def _plan_timeline_greedy(ordered, starts: List[float], ends: List[float]):
+    """
+    逐句放入與理想時間最接近的可用區段 (區段依開始時間與理想時間的距離排序)。
+    以 bisect 找出第一個結束於理想時間之後的區段，再依距離順序往後走，不必每句重建並排序整個區段清單。
+    """
+    cursors = list(starts)
+    plan = []
+    for i, desc in enumerate(ordered):
+        desired_start = desc.get('ideal_start_time', 0.0)
+        audio_duration = desc.get('audio_duration', 0.0)
+        first = bisect.bisect_right(ends, desired_start)
+        # 包含理想時間的區段 (若有) 依其開始時間的距離插入後續區段的順序中
+        containing = first if first < len(starts) and starts[first] <= desired_start else None
+        later = range(first + 1 if containing is not None else first, len(starts))
+
+        def candidates():
+            pending = containing
+            for idx in later:
+                if pending is not None and desired_start - starts[pending] <= starts[idx] - desired_start:
+                    yield pending
+                    pending = None
+                yield idx
+            if pending is not None:
+                yield pending
+
+        placement = None
+        for seg_idx in candidates():
+            cursor = max(cursors[seg_idx], desired_start)
+            if cursor >= ends[seg_idx]: continue
+            fit = _fit_in_segment(cursor, ends[seg_idx], audio_duration)
+            if fit:
+                placement = (i, cursor) + fit
+                cursors[seg_idx] = cursor + fit[1]
+                break
+        plan.append(placement)
+    return plan
+
+def _plan_timeline_optimal(ordered, starts: List[float], ends: List[float]):
+    """
+    動態規劃：依理想時間順序處理每一句，狀態為 "上一句旁白結束的時間"。
+    每句可捨棄，或放入接下來 TIMELINE_LOOKAHEAD_SEGMENTS 個區段之一 (盡早開始)；
+    成本 = 偏移秒數 × TIMELINE_DRIFT_COST + (倍率 - 1) × 語音秒數 × TIMELINE_SPEEDUP_COST + 捨棄句數 × TIMELINE_DROP_COST。
+    結束時間越早的狀態對後續只會更有利，因此每一步只保留 (結束時間, 成本) 的 Pareto 前緣。
+    """
+    # 狀態：(累計成本, 結束時間, 回溯節點)；回溯節點為 (上一節點, 決策)
+    states = [(0.0, 0.0, None)]
+    for i, desc in enumerate(ordered):
+        desired_start = desc.get('ideal_start_time', 0.0)
+        audio_duration = desc.get('audio_duration', 0.0)
+        next_states = []
+        for cost, cursor, node in states:
+            next_states.append((cost + TIMELINE_DROP_COST, cursor, (node, (i, None))))
+            earliest = max(cursor, desired_start)
+            first = bisect.bisect_right(ends, earliest)
+            for seg_idx in range(first, min(first + TIMELINE_LOOKAHEAD_SEGMENTS, len(starts))):
+                start = max(starts[seg_idx], earliest)
+                fit = _fit_in_segment(start, ends[seg_idx], audio_duration)
+                if not fit: continue
+                speed, clip = fit
+                step_cost = (start - desired_start) * TIMELINE_DRIFT_COST + (speed - 1.0) * audio_duration * TIMELINE_SPEEDUP_COST
+                next_states.append((cost + step_cost, start + clip, (node, (i, start, speed, clip))))
+
+        # Pareto 前緣：依結束時間排序，只保留比所有更早結束的狀態成本更低者
+        next_states.sort(key=lambda state: (state[1], state[0]))
+        states, best_cost = [], float("inf")
+        for state in next_states:
+            if state[0] < best_cost:
+                states.append(state)
+                best_cost = state[0]
+        if len(states) > TIMELINE_MAX_STATES:
+            states = sorted(states, key=lambda state: state[0])[:TIMELINE_MAX_STATES]
+
+    _, _, node = min(states, key=lambda state: state[0])
+    plan = [None] * len(ordered)
+    while node is not None:
+        node, decision = node
+        if decision[1] is not None:
+            plan[decision[0]] = decision
+    return plan
+
+def step5_plan_timeline(descriptions, video_duration, non_dialogue_segments, planner: str = None):
+    planner = planner or TIMELINE_PLANNER
     print("\n" + "="*50)
     print("--- 步驟 5: 動態規劃旁白時間軸 ---")
-    print(f"影片總長度: {video_duration:.2f} 秒，最大加速容忍度: {MAX_SPEEDUP_FACTOR}")
+    print(f"影片總長度: {video_duration:.2f} 秒，最大加速容忍度: {MAX_SPEEDUP_FACTOR}，排程方式: {planner}")
     print("="*50)
     if not descriptions: return None
     if not non_dialogue_segments:
         non_dialogue_segments = [(0, video_duration)]
-    
-    seg_cursors = {i: seg[0] for i, seg in enumerate(non_dialogue_segments)}
-    planned_descriptions = []
 
-    for i, desc in enumerate(sorted(descriptions, key=lambda x: x['ideal_start_time'])):
-        desired_start = desc.get('ideal_start_time', 0.0)
-        audio_duration = desc.get('audio_duration', 0.0)
-        placed = False
-        
-        # 尋找所有未來可用的區段
-        available_segments = [
-            (idx, seg_start, seg_end) for idx, (seg_start, seg_end) in enumerate(non_dialogue_segments)
-            if seg_end > desired_start
-        ]
+    segments = sorted(non_dialogue_segments)
+    starts = [seg_start for seg_start, _ in segments]
+    ends = [seg_end for _, seg_end in segments]
+    ordered = sorted(descriptions, key=lambda x: x['ideal_start_time'])
+    if planner == "optimal":
+        plan = _plan_timeline_optimal(ordered, starts, ends)
+    else:
+        plan = _plan_timeline_greedy(ordered, starts, ends)
 
-        # 按照與 ideal_start_time 的接近程度排序
-        available_segments.sort(key=lambda x: abs(x[1] - desired_start))
-
-        for seg_idx, seg_start, seg_end in available_segments:
-            cursor = max(seg_cursors.get(seg_idx, seg_start), desired_start)
-            if cursor >= seg_end: continue
-
-            available_duration = seg_end - cursor
-            
-            if available_duration >= audio_duration:
-                desc.update({'final_start_time': cursor, 'speed_factor': 1.0, 'final_clip_duration': audio_duration})
-                seg_cursors[seg_idx] = cursor + audio_duration
-                print(f"  - 第 {i+1} 句: (時間 {cursor:.2f}s) 正常播放。")
-                placed = True
-                break
-            elif available_duration > 0.5 and (audio_duration / available_duration) <= MAX_SPEEDUP_FACTOR:
-                required_speedup = audio_duration / available_duration
-                desc.update({'final_start_time': cursor, 'speed_factor': required_speedup, 'final_clip_duration': available_duration})
-                seg_cursors[seg_idx] = cursor + available_duration
-                print(f"  - [注意] 第 {i+1} 句: (時間 {cursor:.2f}s) 空間不足，加速 {required_speedup:.2f} 倍。")
-                placed = True
-                break
-
-        if placed:
-            planned_descriptions.append(desc)
+    planned_descriptions = []
+    for i, (desc, placement) in enumerate(zip(ordered, plan)):
+        if placement is None:
+            print(f"  - [警告] 第 {i+1} 句: (理想時間 {desc.get('ideal_start_time', 0.0):.2f}s) 找不到合適的無人聲區段，捨棄。")
+            continue
+        _, start, speed, clip = placement
+        desc.update({'final_start_time': start, 'speed_factor': speed, 'final_clip_duration': clip})
+        if speed > 1.0:
+            print(f"  - [注意] 第 {i+1} 句: (時間 {start:.2f}s) 空間不足，加速 {speed:.2f} 倍。")
         else:
-            print(f"  - [警告] 第 {i+1} 句: (理想時間 {desired_start:.2f}s) 找不到合適的無人聲區段，捨棄。")
+            print(f"  - 第 {i+1} 句: (時間 {start:.2f}s) 正常播放。")
+        planned_descriptions.append(desc)
 
     print(f"\n[成功] 步驟 5 完成！成功規劃了 {len(planned_descriptions)} 條旁白。")
     return sorted(planned_descriptions, key=lambda x: x['final_start_time'])
 
+def probe_video_codec(video_path: str) -> Tuple[str, float]:
+    """以 ffprobe 取得 (第一條視訊串流的編碼名稱, 影片總長秒數)，取不到的欄位為 None"""
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name:format=duration", "-of", "json", video_path,
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        info = json.loads(proc.stdout or "{}")
+    except Exception as e:
+        print(f"  [警告] 無法以 ffprobe 取得視訊資訊: {e}")
+        return None, None
+    streams = info.get("streams") or [{}]
+    try:
+        duration = float(info.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    return streams[0].get("codec_name"), duration
+
+def mux_audio_stream_copy(video_path: str, audio_path: str, output_path: str, codec: str = None) -> bool:
+    """
+    將 audio_path 編碼為 AAC，並與原影片的視訊串流 (不重新編碼) 封裝成 output_path。
+    codec 為 hevc 時加上 hvc1 標籤，否則 QuickTime / Apple 裝置無法播放。
+    """
+    cmd = [
+        "ffmpeg", "-y", "-nostdin", "-v", "error",
+        "-i", video_path, "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy", "-c:a", "aac", "-b:a", "192k",
+    ]
+    if codec == "hevc":
+        cmd += ["-tag:v", "hvc1"]
+    cmd += ["-movflags", "+faststart", output_path]
+    proc = subprocess.run(cmd, capture_output=True)
+    if proc.returncode != 0:
+        stderr_text = proc.stderr.decode("utf-8", errors="replace")
+        print(f"  [警告] ffmpeg 封裝失敗，將改為重新編碼: {stderr_text.strip()[-500:]}")
+        return False
+    return True
+
+def change_speed(pcm: np.ndarray, factor: float) -> np.ndarray:
+    """以線性內插重取樣加速音訊 (與 moviepy speedx 相同，音高會一起提高)"""
+    if factor <= 1.0 or len(pcm) < 2:
+        return pcm
+    positions = np.arange(int(len(pcm) / factor), dtype=np.float64) * factor
+    source = np.arange(len(pcm), dtype=np.float64)
+    return np.stack([np.interp(positions, source, pcm[:, ch]) for ch in range(pcm.shape[1])], axis=1).astype(np.float32)
+
+def time_stretch_wsola(pcm: np.ndarray, factor: float, sample_rate: int,
+                       frame_seconds: float = 0.04, tolerance_seconds: float = 0.01) -> np.ndarray:
+    """
+    WSOLA (Waveform Similarity Overlap-Add) 時間伸縮：長度變為 1/factor，音高不變。
+    每個輸出影格在理想讀取位置前後 tolerance 內，以 FFT 互相關尋找與上一影格自然延續最相似的位置，
+    再以 Hann 窗重疊相加。
+    """
+    if factor <= 1.0 or len(pcm) < 2:
+        return pcm
+    frame = max(64, int(frame_seconds * sample_rate)) // 2 * 2
+    hop_out = frame // 2
+    hop_in = hop_out * factor
+    tolerance = max(1, int(tolerance_seconds * sample_rate))
+    window = np.hanning(frame).astype(np.float32)
+
+    out_len = int(len(pcm) / factor)
+    frame_count = out_len // hop_out + 1
+    padded = np.pad(pcm, ((tolerance, frame + hop_out + tolerance + int(np.ceil(hop_in)) + 1), (0, 0)))
+    mono = padded.mean(axis=1)
+    fft_size = 1 << int(np.ceil(np.log2(frame + 2 * tolerance + frame)))
+
+    output = np.zeros((frame_count * hop_out + frame, pcm.shape[1]), dtype=np.float32)
+    weight = np.zeros(len(output), dtype=np.float32)
+    shift = 0
+    for k in range(frame_count):
+        read = min(int(round(k * hop_in)) + tolerance + shift, len(padded) - frame - hop_out)
+        write = k * hop_out
+        output[write:write + frame] += padded[read:read + frame] * window[:, None]
+        weight[write:write + frame] += window
+
+        # 下一影格：在理想位置 ±tolerance 內找與 "本影格自然延續" 最相似的片段
+        natural = mono[read + hop_out:read + hop_out + frame]
+        ideal = int(round((k + 1) * hop_in)) + tolerance
+        lo = max(0, ideal - tolerance)
+        region = mono[lo:ideal + tolerance + frame]
+        if len(region) < frame or len(natural) < frame:
+            shift = 0
+            continue
+        corr = np.fft.irfft(np.fft.rfft(region, fft_size) * np.conj(np.fft.rfft(natural, fft_size)), fft_size)
+        best = int(np.argmax(corr[:len(region) - frame + 1]))
+        shift = lo + best - ideal
+
+    nonzero = weight > 1e-8
+    output[nonzero] /= weight[nonzero, None]
+    return output[:out_len]
+
+def stretch_narration(pcm: np.ndarray, factor: float, sample_rate: int) -> np.ndarray:
+    """依設定以 WSOLA (保留音高) 或重取樣加速旁白；每句只在混音時計算一次，不寫入磁碟"""
+    if factor <= 1.0:
+        return pcm
+    if not TIME_STRETCH_PRESERVE_PITCH:
+        return change_speed(pcm, factor)
+    return time_stretch_wsola(pcm, factor, sample_rate)
+
+def duck_background(background: np.ndarray, spans: List[Tuple[int, int]], gain: float, fade: int) -> None:
+    """就地將背景音在旁白區段 (樣本索引) 內乘上 gain，前後以 fade 個樣本線性過渡"""
+    if gain >= 1.0 or not spans:
+        return
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start - fade <= merged[-1][1] + fade:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    n = len(background)
+    for start, end in merged:
+        lo, hi = max(0, start - fade), min(n, end + fade)
+        if lo >= hi: continue
+        idx = np.arange(lo, hi, dtype=np.float32)
+        # 距離旁白區段越遠越接近 1，區段內為 0
+        distance = np.maximum(np.maximum(start - idx, idx - (end - 1)), 0) / max(1, fade)
+        envelope = gain + (1.0 - gain) * np.minimum(distance, 1.0)
+        background[lo:hi] *= envelope[:, None]
+
+def load_narration(desc, sample_rate: int):
+    """解碼單句旁白並套用加速與長度上限；無法使用時回傳 None"""
+    if 'audio_path' not in desc or not os.path.exists(desc['audio_path']):
+        return None
+    pcm = decode_audio(desc['audio_path'], sample_rate, channels=2)
+    if pcm is None:
+        return None
+    pcm = stretch_narration(pcm, desc.get('speed_factor', 1.0), sample_rate)
+    max_duration = desc.get('final_clip_duration')
+    if max_duration is not None:
+        pcm = pcm[:int(round(max_duration * sample_rate))]
+    return pcm
+
+def mix_narration_track(video_path: str, descriptions, video_duration: float, output_path: str,
+                        sample_rate: int = FINAL_AUDIO_SAMPLE_RATE, block_seconds: float = MIX_BLOCK_SECONDS) -> None:
+    """
+    將背景音與所有旁白逐區塊混成立體聲，直接寫成 16-bit PCM WAV (output_path)。
+    背景音以 iter_audio_blocks 串流解碼，每次只處理 block_seconds 秒，並在同一個區塊緩衝上就地完成
+    音量、壓低、疊加與轉換；旁白在區塊接近其起點時才解碼，播完即釋放。
+    """
+    total = int(round(video_duration * sample_rate))
+    block_frames = max(1, int(block_seconds * sample_rate))
+    fade = int(NARRATION_DUCKING_FADE * sample_rate)
+    margin = 2 * fade + 1  # 相隔 2*fade 內的旁白會合併壓低，區塊前後需看到這個範圍內的旁白
+    pending = sorted(
+        (int(round(desc['final_start_time'] * sample_rate)), i) for i, desc in enumerate(descriptions)
+    )
+    next_pending = 0
+    active = []  # (起點, 終點, PCM)：與目前區塊 (含前後 margin) 重疊的旁白
+
+    block = np.empty((block_frames, 2), dtype=np.float32)
+    samples = np.empty((block_frames, 2), dtype="<i2")
+    background = iter_audio_blocks(video_path, sample_rate, 2, block_frames)
+    try:
+        with wave.open(output_path, "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            pos = 0
+            while pos < total:
+                n = min(block_frames, total - pos)
+                view = block[:n]
+                chunk = next(background, None)
+                length = 0 if chunk is None else min(n, len(chunk))
+                if length:
+                    np.multiply(chunk[:length], BACKGROUND_VOLUME, out=view[:length])
+                view[length:] = 0.0
+
+                while next_pending < len(pending) and pending[next_pending][0] < pos + n + margin:
+                    start, i = pending[next_pending]
+                    next_pending += 1
+                    pcm = load_narration(descriptions[i], sample_rate)
+                    if pcm is None: continue
+                    end = min(total, start + len(pcm))
+                    if start < end:
+                        active.append((start, end, pcm))
+
+                duck_background(view, [(start - pos, end - pos) for start, end, _ in active],
+                                NARRATION_DUCKING_VOLUME, fade)
+                for start, end, pcm in active:
+                    lo, hi = max(start, pos), min(end, pos + n)
+                    if lo < hi:
+                        view[lo - pos:hi - pos] += pcm[lo - start:hi - start] * NARRATION_VOLUME
+                active = [item for item in active if item[1] + margin > pos + n]
+
+                np.clip(view, -1.0, 1.0, out=view)
+                np.multiply(view, 32767.0, out=view)
+                samples[:n] = view
+                wav.writeframes(samples[:n].tobytes())
+                pos += n
+    finally:
+        background.close()
+
 def step6_synthesize_final_video(video_path, descriptions, output_path):
     print("\n" + "="*50)
     print("--- 步驟 6: 最終影片合成 ---")
@@ -475,42 +1785,29 @@ def step6_synthesize_final_video(video_path, descriptions, output_path):
         shutil.copy(video_path, output_path)
         return True
     
-    video_clip = None
+    video_clip, mix_clip = None, None
+    fd, mix_path = tempfile.mkstemp(suffix=".wav", dir=os.path.dirname(os.path.abspath(output_path)))
+    os.close(fd)
     try:
-        video_clip = VideoFileClip(video_path)
-        narration_clips = []
-
-        for desc in descriptions:
-            if 'audio_path' in desc and os.path.exists(desc['audio_path']):
-                audio_clip = AudioFileClip(desc['audio_path'])
-                speed_factor = desc.get('speed_factor', 1.0)
-
-                if speed_factor > 1.0:
-                    audio_clip = audio_clip.fx(vfx.speedx, speed_factor)
-                
-                clip_duration = min(audio_clip.duration, desc.get('final_clip_duration', audio_clip.duration))
-                if clip_duration < audio_clip.duration:
-                    audio_clip = audio_clip.subclip(0, clip_duration)
-                
-                # 【核心修正】使用 .fx() 來套用 volumex 效果
-                audio_clip = audio_clip.fx(afx.volumex, NARRATION_VOLUME)
-                audio_clip = audio_clip.set_start(desc['final_start_time'])
-                narration_clips.append(audio_clip)
-
-        original_audio = video_clip.audio
-        if original_audio:
-            # 【核心修正】使用 .fx() 來套用 volumex 效果
-            original_audio = original_audio.fx(afx.volumex, BACKGROUND_VOLUME)
-            final_audio_clips = [original_audio] + narration_clips
-        else:
-            final_audio_clips = narration_clips
-
-        if not final_audio_clips:
-             video_clip.audio = None
-        else:
-            final_audio = CompositeAudioClip(final_audio_clips)
-            video_clip.audio = final_audio.set_duration(video_clip.duration)
+        # 影片長度直接取自 ffprobe；只有 ffprobe 取不到或需要重新編碼時才以 MoviePy 開啟影片
+        codec, video_duration = probe_video_codec(video_path)
+        if video_duration is None:
+            video_clip = VideoFileClip(video_path)
+            video_duration = video_clip.duration
+        print("正在混合背景音與旁白...")
+        mix_narration_track(video_path, descriptions, video_duration, mix_path)
+
+        if STEP6_STREAM_COPY:
+            if codec in STREAM_COPY_VIDEO_CODECS:
+                print(f"\n視訊編碼為 {codec}，僅混音並直接封裝 (不重新編碼畫面) -> {output_path}")
+                if mux_audio_stream_copy(video_path, mix_path, output_path, codec):
+                    return True
+            else:
+                print(f"\n視訊編碼 {codec or '未知'} 無法直接放入 MP4，將重新編碼。")
 
+        video_clip = video_clip or VideoFileClip(video_path)
+        mix_clip = AudioFileClip(mix_path)
+        video_clip.audio = mix_clip.set_duration(video_clip.duration)
         print(f"\n正在生成最終影片 -> {output_path}")
         # 【核心修正】將 logger='bar' 改為 None，以避免在子程序中因進度條輸出而卡住
         video_clip.write_videofile(output_path, codec='libx264', audio_codec='aac', threads=4, logger=None)
@@ -524,62 +1821,121 @@ def step6_synthesize_final_video(video_path, descriptions, output_path):
     finally:
         # 清理 MoviePy 資源
         if video_clip: video_clip.close()
-        if 'narration_clips' in locals(): 
-            for clip in narration_clips: clip.close()
-        if 'original_audio' in locals() and original_audio: original_audio.close()
-        if 'final_audio' in locals() and 'final_audio' in locals() and final_audio: final_audio.close()
+        if mix_clip: mix_clip.close()
+        if os.path.exists(mix_path): os.remove(mix_path)
 
 
-def cleanup(keyframe_dir, temp_audio_dir):
+def cleanup(*dirs):
     print("正在刪除暫存檔案...")
-    if os.path.isdir(keyframe_dir):
-        try:
-            shutil.rmtree(keyframe_dir)
-            print(f" - 已刪除目錄: {keyframe_dir}")
-        except Exception as e:
-            print(f" - [警告] 刪除 {keyframe_dir} 失敗: {e}")
-    if os.path.isdir(temp_audio_dir):
+    for directory in dirs:
+        if os.path.isdir(directory):
+            try:
+                shutil.rmtree(directory)
+                print(f" - 已刪除目錄: {directory}")
+            except Exception as e:
+                print(f" - [警告] 刪除 {directory} 失敗: {e}")
+
+# --------------------------------------------------------------------------
+#                           流程檢查點
+# --------------------------------------------------------------------------
+
+PIPELINE_MANIFEST_NAME = "manifest.json"
+PIPELINE_MANIFEST_VERSION = 1
+
+def fingerprint(*parts) -> str:
+    """將任意可 JSON 序列化的資料計算為穩定的 SHA-256 雜湊"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def video_fingerprint(video_path: str) -> str:
+    """以路徑、大小與修改時間代表影片內容 (避免每次都讀完整個影片檔計算雜湊)"""
+    st = os.stat(video_path)
+    return fingerprint(os.path.abspath(video_path), st.st_size, st.st_mtime_ns)
+
+class PipelineCheckpoint:
+    """
+    以工作目錄中的 JSON manifest 記錄每個步驟的輸入雜湊與輸出。
+    resume=True 時，輸入雜湊相同且所需檔案仍存在的步驟會直接沿用先前的輸出。
+    """
+    def __init__(self, work_dir: str, resume: bool = False):
+        self.work_dir = work_dir
+        self.path = os.path.join(work_dir, PIPELINE_MANIFEST_NAME)
+        os.makedirs(work_dir, exist_ok=True)
+        self.steps = {}
+        if resume and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == PIPELINE_MANIFEST_VERSION:
+                    self.steps = manifest.get("steps", {})
+            except (OSError, ValueError) as e:
+                print(f"[警告] 無法讀取流程紀錄 {self.path}，將重新執行所有步驟: {e}")
+
+    def load(self, step: str, input_hash: str):
+        """回傳符合的步驟紀錄 (含 "output")，不符合時回傳 None"""
+        entry = self.steps.get(step)
+        if not entry or entry.get("input_hash") != input_hash:
+            return None
+        if not all(os.path.exists(path) for path in entry.get("files", [])):
+            return None
+        print(f"[接續] {step} 的輸入未變更，沿用先前的結果。")
+        return entry
+
+    def save(self, step: str, input_hash: str, output, files: Sequence[str] = ()) -> str:
+        """記錄步驟輸出並回傳輸出雜湊，供下一個步驟組成輸入雜湊"""
+        output_hash = fingerprint(output)
+        self.steps[step] = {
+            "input_hash": input_hash, "output_hash": output_hash, "output": output,
+            "files": list(files), "completed_at": time.time(),
+        }
+        tmp_path = self.path + ".tmp"
         try:
-            shutil.rmtree(temp_audio_dir)
-            print(f" - 已刪除目錄: {temp_audio_dir}")
-        except Exception as e:
-            print(f" - [警告] 刪除 {temp_audio_dir} 失敗: {e}")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": PIPELINE_MANIFEST_VERSION, "steps": self.steps}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[警告] 無法寫入流程紀錄: {e}")
+        return output_hash
+
+class PipelineCancelled(Exception):
+    """使用者在流程執行中取消工作"""
+    pass
+
+
+def raise_if_cancelled(should_cancel) -> None:
+    """should_cancel() 回傳 True 時引發 PipelineCancelled；供各步驟在每幀 / 每次請求前檢查"""
+    if should_cancel and should_cancel():
+        raise PipelineCancelled("已在步驟執行中取消。")
+
+
+PIPELINE_TOTAL_STEPS = 7
 
-def main():
-    # --- 【修改】移除 tkinter 詢問 ---
-    # root = tk.Tk()
-    # root.withdraw()
-    # video_filepath = filedialog.askopenfilename( ... )
-    # if not video_filepath:
-    #     print("未選擇任何檔案，程式結束。")
-    #     messagebox.showinfo("提示", "您沒有選擇任何影片檔案，處理程序已取消。")
-    #     return
-    
-    # --- 【修改】新增 argparse ---
-    parser = argparse.ArgumentParser(description="生成影片口述影像")
-    parser.add_argument("--video_file", type=str, required=True, help="要處理的影片檔案路徑")
-    parser.add_argument("--summary", type=str, required=True, help="使用者提供的影片摘要")
-    args = parser.parse_args()
-    
-    video_filepath = args.video_file
-    video_summary = args.summary
-    # --- argparse 結束 ---
 
+def run_pipeline(video_filepath: str, video_summary: str, progress=None, should_cancel=None, speech_backend: str = None,
+                 resume: bool = False) -> str:
+    """
+    執行完整的影片口述影像流程 (步驟 0~6)，回傳最終影片路徑。
+    每個步驟的輸出都記錄在 <影片名稱>_work/manifest.json；resume=True 時略過輸入未變更的步驟。
+    progress(step, total, message) 會在每個步驟開始時被呼叫；
+    should_cancel() 回傳 True 時會在下一個步驟開始前引發 PipelineCancelled。
+    speech_backend 可為 "whisper" 或 "vad"，未指定時使用 SPEECH_DETECTION_BACKEND。
+    失敗時引發例外。
+    """
     if not os.path.exists(video_filepath):
-         print(f"錯誤：找不到影片檔案 {video_filepath}", file=sys.stderr)
-         sys.exit(1)
+        raise FileNotFoundError(f"找不到影片檔案 {video_filepath}")
+    API_KEY = load_api_key()
 
-    # --- 【修改】移除 video_summary 的 tkinter 詢問 ---
-    # video_summary = simpledialog.askstring("影片摘要", "請為這段影片提供一個簡短的摘要（例如：主角是誰、在做什麼）：", parent=root)
-    # if not video_summary:
-    #     video_summary = "一段影片。"
+    def _enter_step(step: int, message: str):
+        if should_cancel and should_cancel():
+            raise PipelineCancelled(f"已在步驟 {step} 前取消。")
+        if progress:
+            progress(step, PIPELINE_TOTAL_STEPS, message)
 
     VIDEO_FILENAME = os.path.basename(video_filepath)
     VIDEO_DIR = os.path.dirname(video_filepath)
     BASE_NAME = os.path.splitext(VIDEO_FILENAME)[0]
-    KEYFRAME_DIR = os.path.join(VIDEO_DIR, f"{BASE_NAME}_keyframes")
-    global TEMP_AUDIO_DIR
-    TEMP_AUDIO_DIR = os.path.join(VIDEO_DIR, f"temp_audio_{BASE_NAME}")
+    WORK_DIR = os.path.join(VIDEO_DIR, f"{BASE_NAME}_work")
+    KEYFRAME_DIR = os.path.join(WORK_DIR, "keyframes")
     FINAL_VIDEO_PATH = os.path.join(VIDEO_DIR, f"{BASE_NAME}_narrated.mp4")
     FINAL_TXT = os.path.join(VIDEO_DIR, f"{BASE_NAME}_final_script.txt")
 
@@ -588,34 +1944,128 @@ def main():
     print(f"      口述影像自動生成腳本已啟動\n      處理影片: {VIDEO_FILENAME}")
     print("="*50)
 
+    checkpoint = PipelineCheckpoint(WORK_DIR, resume=resume)
+    background = ThreadPoolExecutor(max_workers=2)
+    keyframe_feed = None
+    succeeded = False
     try:
         with VideoFileClip(video_filepath) as video:
             video_total_duration = video.duration
-        
-        # --- 完整流程 ---
-        speech_segments = step0_detect_voice_segments(video_filepath)
-        if not step1_extract_keyframes(video_filepath, KEYFRAME_DIR):
-            raise RuntimeError("步驟 1 失敗，程式結束。")
-
-        non_dialogue_segments = get_non_dialogue_segments(speech_segments, video_total_duration)
-        initial_descriptions = step2_generate_initial_descriptions(API_KEY, KEYFRAME_DIR, video_summary, video_total_duration, non_dialogue_segments)
-        if not initial_descriptions:
-            raise RuntimeError("步驟 2 失敗，程式結束。")
-
-        refined_descriptions = step3_refine_and_merge_descriptions(API_KEY, initial_descriptions, video_summary, non_dialogue_segments)
-        if not refined_descriptions:
-            # 步驟3失敗時，使用步驟2的結果繼續
-            print("[警告] 步驟 3 失敗，將使用未精煉的描述繼續。")
-            refined_descriptions = initial_descriptions
-
-        audio_data = step4_generate_audio_and_measure_duration(refined_descriptions)
-        if not audio_data:
-            raise RuntimeError("步驟 4 失敗，程式結束。")
-
-        timeline_data = step5_plan_timeline(audio_data, video_total_duration, non_dialogue_segments)
+        video_hash = video_fingerprint(video_filepath)
+        speech_backend = speech_backend or SPEECH_DETECTION_BACKEND
+
+        # --- 完整流程 (每一步的輸入雜湊都包含上一步的輸出雜湊) ---
+        # 步驟 0 在背景執行緒進行；串流模式下步驟 1 同時在另一個執行緒擷取關鍵影格，步驟 2 邊收邊描述。
+        _enter_step(0, "偵測人聲區段")
+        step0_hash = fingerprint("step0", video_hash, speech_backend)
+        entry0 = checkpoint.load("step0", step0_hash)
+        if entry0:
+            speech_future = Future()
+            speech_future.set_result([tuple(seg) for seg in entry0["output"]])
+        else:
+            speech_future = background.submit(step0_detect_voice_segments, video_filepath, backend=speech_backend)
+        non_dialogue_cache = []
+
+        def wait_non_dialogue_segments():
+            if not non_dialogue_cache:
+                non_dialogue_cache.append(get_non_dialogue_segments(speech_future.result(), video_total_duration))
+            return non_dialogue_cache[0]
+
+        def finish_step0() -> str:
+            if entry0:
+                return entry0["output_hash"]
+            return checkpoint.save("step0", step0_hash, [list(seg) for seg in speech_future.result()])
+
+        _enter_step(1, "擷取關鍵影格")
+        step1_hash = fingerprint("step1", video_hash, SHARPNESS_PROXY_WIDTH, SHARPNESS_FRAME_STRIDE, SHARPNESS_FAST_DTYPE,
+                                 KEYFRAME_UPLOAD_MAX_EDGE, KEYFRAME_UPLOAD_JPEG_QUALITY, KEYFRAME_UPLOAD_GRAYSCALE,
+                                 KEYFRAME_UPLOAD_CROP, PIPELINE_STREAMING and KEYFRAME_EXTRACTION_WORKERS <= 1)
+        entry1 = checkpoint.load("step1", step1_hash)
+        keyframe_feed = extraction = None
+        if entry1:
+            keyframe_hash = entry1["output_hash"]
+        else:
+            shutil.rmtree(KEYFRAME_DIR, ignore_errors=True)
+            if PIPELINE_STREAMING and KEYFRAME_EXTRACTION_WORKERS <= 1:
+                keyframe_feed = KeyframeFeed()
+                extraction = background.submit(step1_extract_keyframes_streaming, video_filepath, KEYFRAME_DIR, keyframe_feed,
+                                               should_cancel=should_cancel)
+            elif not step1_extract_keyframes(video_filepath, KEYFRAME_DIR, should_cancel=should_cancel):
+                raise RuntimeError("步驟 1 失敗，程式結束。")
+
+        def finish_step1() -> str:
+            keyframes = sorted(f for f in os.listdir(KEYFRAME_DIR) if f.lower().endswith('.jpg'))
+            return checkpoint.save("step1", step1_hash, keyframes, files=[os.path.join(KEYFRAME_DIR, f) for f in keyframes])
+
+        _enter_step(2, "AI 生成初步描述")
+        if keyframe_feed is not None:
+            initial_descriptions = step2_generate_initial_descriptions(
+                API_KEY, KEYFRAME_DIR, video_summary, video_total_duration, wait_non_dialogue_segments,
+                keyframes=keyframe_feed, should_cancel=should_cancel,
+            )
+            if not extraction.result():
+                raise RuntimeError("步驟 1 失敗，程式結束。")
+            keyframe_hash = finish_step1()
+            output_hash = finish_step0()
+            if not initial_descriptions:
+                raise RuntimeError("步驟 2 失敗，程式結束。")
+            step2_hash = fingerprint("step2", keyframe_hash, output_hash, video_summary, video_total_duration,
+                                     GEMINI_MODEL_NAME, GEMINI_MAX_CONCURRENCY, GEMINI_FRAMES_PER_REQUEST)
+            output_hash = checkpoint.save("step2", step2_hash, initial_descriptions)
+        else:
+            if not entry1:
+                keyframe_hash = finish_step1()
+            output_hash = finish_step0()
+            step2_hash = fingerprint("step2", keyframe_hash, output_hash, video_summary, video_total_duration,
+                                     GEMINI_MODEL_NAME, GEMINI_MAX_CONCURRENCY, GEMINI_FRAMES_PER_REQUEST)
+            entry = checkpoint.load("step2", step2_hash)
+            if entry:
+                initial_descriptions, output_hash = entry["output"], entry["output_hash"]
+            else:
+                initial_descriptions = step2_generate_initial_descriptions(API_KEY, KEYFRAME_DIR, video_summary, video_total_duration,
+                                                                           wait_non_dialogue_segments(), should_cancel=should_cancel)
+                if not initial_descriptions:
+                    raise RuntimeError("步驟 2 失敗，程式結束。")
+                output_hash = checkpoint.save("step2", step2_hash, initial_descriptions)
+        non_dialogue_segments = wait_non_dialogue_segments()
+
+        _enter_step(3, "AI 精煉與合併描述")
+        step_hash = fingerprint("step3", output_hash, video_summary, non_dialogue_segments, GEMINI_MODEL_NAME)
+        entry = checkpoint.load("step3", step_hash)
+        if entry:
+            refined_descriptions, output_hash = entry["output"], entry["output_hash"]
+        else:
+            refined_descriptions = step3_refine_and_merge_descriptions(API_KEY, initial_descriptions, video_summary, non_dialogue_segments)
+            if not refined_descriptions:
+                # 步驟3失敗時，使用步驟2的結果繼續
+                print("[警告] 步驟 3 失敗，將使用未精煉的描述繼續。")
+                refined_descriptions = initial_descriptions
+            output_hash = checkpoint.save("step3", step_hash, refined_descriptions)
+
+        _enter_step(4, "生成語音並測量時長")
+        step_hash = fingerprint("step4", output_hash, VOICE, VOICE_LOCALE)
+        entry = checkpoint.load("step4", step_hash)
+        if entry:
+            audio_data, output_hash = entry["output"], entry["output_hash"]
+        else:
+            audio_data = step4_generate_audio_and_measure_duration(refined_descriptions, should_cancel=should_cancel)
+            if not audio_data:
+                raise RuntimeError("步驟 4 失敗，程式結束。")
+            output_hash = checkpoint.save("step4", step_hash, audio_data, files=[d['audio_path'] for d in audio_data])
+
+        _enter_step(5, "規劃旁白時間軸")
+        step_hash = fingerprint("step5", output_hash, video_total_duration, non_dialogue_segments, MAX_SPEEDUP_FACTOR,
+                                TIMELINE_PLANNER, TIMELINE_DRIFT_COST, TIMELINE_SPEEDUP_COST, TIMELINE_DROP_COST)
+        entry = checkpoint.load("step5", step_hash)
+        if entry:
+            timeline_data = entry["output"]
+        else:
+            timeline_data = step5_plan_timeline(audio_data, video_total_duration, non_dialogue_segments)
+            checkpoint.save("step5", step_hash, timeline_data)
         if not timeline_data:
             print("\n[流程中止] 步驟 5 未能規劃任何旁白。")
 
+        _enter_step(6, "合成最終影片")
         if timeline_data and not step6_synthesize_final_video(video_filepath, timeline_data, FINAL_VIDEO_PATH):
             raise RuntimeError("步驟 6 失敗，程式結束。")
 
@@ -643,26 +2093,46 @@ def main():
         print("\n" + "="*50)
         print(summary_message.replace("\n\n", "\n"))
         print("="*50)
-        # messagebox.showinfo("處理完成", summary_message) # 移除
+        succeeded = True
+        return FINAL_VIDEO_PATH
+
+    finally:
+        if keyframe_feed is not None and not keyframe_feed.closed:
+            keyframe_feed.cancel()
+        background.shutdown(wait=True)
+        if AUTO_CLEANUP_TEMP_FILES and succeeded:
+            cleanup(WORK_DIR)
+        elif not succeeded:
+            print(f"已保留工作目錄 {WORK_DIR}，可加上 --resume 從中斷的步驟繼續。")
+        else:
+            print("已保留所有暫存檔案。") # 簡化邏輯
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成影片口述影像")
+    parser.add_argument("--video_file", type=str, required=True, help="要處理的影片檔案路徑")
+    parser.add_argument("--summary", type=str, required=True, help="使用者提供的影片摘要")
+    parser.add_argument("--speech_backend", type=str, choices=["whisper", "vad"], default=None,
+                        help=f"人聲偵測方式 (預設: {SPEECH_DETECTION_BACKEND})")
+    parser.add_argument("--resume", action="store_true",
+                        help="沿用工作目錄中輸入未變更的步驟結果，從中斷處繼續")
+    args = parser.parse_args()
 
+    if not os.path.exists(args.video_file):
+         print(f"錯誤：找不到影片檔案 {args.video_file}", file=sys.stderr)
+         sys.exit(1)
+    try:
+        load_api_key()
+    except FileNotFoundError as e:
+        print(f"[嚴重錯誤] {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        run_pipeline(args.video_file, args.summary, speech_backend=args.speech_backend, resume=args.resume)
     except Exception as e:
         error_message = f"[流程中止] 處理過程中發生嚴重錯誤: {e}"
         print(error_message, file=sys.stderr)
         traceback.print_exc(file=sys.stderr)
-        # messagebox.showerror("處理失敗", error_message) # 移除
-    finally:
-        # --- 【修改】移除 tkinter 詢問 ---
-        if AUTO_CLEANUP_TEMP_FILES:
-            cleanup(KEYFRAME_DIR, TEMP_AUDIO_DIR)
-        else:
-            # root_cleanup = tk.Tk()
-            # root_cleanup.withdraw()
-            # if messagebox.askyesno("清理暫存", "是否要刪除過程中產生的暫存檔案？", parent=root_cleanup):
-            #     cleanup(KEYFRAME_DIR, TEMP_AUDIO_DIR)
-            # else:
-            #     print("已保留所有暫存檔案。")
-            # root_cleanup.destroy()
-            print("已保留所有暫存檔案。") # 簡化邏輯
 
     print("\n--- 程式執行完畢 ---")
 
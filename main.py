@@ -75,6 +75,10 @@ _preload_completed = False
 _preload_error = None
 LLAMA_MODEL_DIR = os.path.join(".", "models", "Llama-3.2-11B-Vision-Instruct")
 
+# --- 常駐影片工作程序 ---
+_video_worker = None
+_current_video_job_id = None
+
 # --- GUI 輔助函式 ---
 
 def update_gui_safe(widget, text):
@@ -196,6 +200,60 @@ class ToolTip:
                     tw.destroy()
             except Exception: pass
 
+def append_narration_text_safe(text: str):
+    """串流生成時，將文字片段直接附加到口述影像區塊 (不自動換行)"""
+    if narration_output_widget and app_window and app_window.winfo_exists() and narration_output_widget.winfo_exists():
+        try:
+            narration_output_widget.config(state=tk.NORMAL)
+            narration_output_widget.insert(tk.END, text)
+            narration_output_widget.see(tk.END)
+            narration_output_widget.config(state=tk.DISABLED)
+        except tk.TclError as e:
+            print(f"更新口述影像區塊時發生 TclError (可能視窗已關閉): {e}")
+
+# 串流朗讀：遇到這些字元即視為一句完整的句子
+SENTENCE_END_CHARS = "。！？；!?\n"
+
+class SentenceSpeaker:
+    """接收串流文字片段，每湊滿一句就依序交給背景執行緒朗讀"""
+    def __init__(self):
+        self._buffer = ""
+        self._queue = queue.Queue()
+        self._finished = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, text: str):
+        self._buffer += text
+        start = 0
+        for i, ch in enumerate(self._buffer):
+            if ch in SENTENCE_END_CHARS:
+                self._put(self._buffer[start:i + 1])
+                start = i + 1
+        self._buffer = self._buffer[start:]
+
+    def finish(self):
+        """送出剩餘文字並等待所有句子朗讀完畢"""
+        if self._finished: return
+        self._finished = True
+        self._put(self._buffer)
+        self._buffer = ""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _put(self, sentence: str):
+        if sentence.strip():
+            self._queue.put(sentence.strip())
+
+    def _run(self):
+        while True:
+            sentence = self._queue.get()
+            if sentence is None: break
+            try:
+                speak(sentence, wait=True)
+            except Exception as e:
+                print(f"[語音] 朗讀句子失敗: {e}")
+
 # --- 顯示圖片和文字 ---
 def show_image_and_text(image_path: str, narration_text: str):
     """在 GUI 中顯示圖片預覽和生成的口述影像文字"""
@@ -234,11 +292,12 @@ def show_image_and_text(image_path: str, narration_text: str):
              image_preview_label.image = None
         except tk.TclError: pass
 
-    # 顯示文字
+    # 顯示文字 (空字串代表串流生成即將開始，只清空區塊)
     try:
         narration_output_widget.config(state=tk.NORMAL)
         narration_output_widget.delete('1.0', tk.END)
-        narration_output_widget.insert(tk.END, narration_text.strip() + "\n")
+        if narration_text.strip():
+            narration_output_widget.insert(tk.END, narration_text.strip() + "\n")
         narration_output_widget.config(state=tk.DISABLED)
     except tk.TclError: pass
 
@@ -334,105 +393,90 @@ def open_video_external():
         messagebox.showerror("開啟失敗", f"無法使用系統播放器開啟影片:\n{e}")
 
 # --- 執行緒函式 ---
-def run_script_in_thread(script_name: str, script_type: str, args: list, is_voice_command: bool = False):
-    """在背景執行緒中執行腳本並將輸出傳回 GUI"""
-    global _last_selected_image_path, _voice_interaction_enabled
-    
+def get_video_worker():
+    """取得 (必要時建立) 常駐的影片工作程序客戶端"""
+    global _video_worker
+    if _video_worker is None:
+        from video_worker import VideoWorkerClient
+        _video_worker = VideoWorkerClient()
+    return _video_worker
+
+def cancel_current_video_job():
+    """取消目前正在執行的影片工作"""
+    if _video_worker and _current_video_job_id:
+        try:
+            _video_worker.cancel(_current_video_job_id)
+            update_status_safe("正在取消影片處理...")
+        except Exception as e:
+            print(f"[警告] 取消影片工作失敗: {e}")
+
+def run_video_job_in_thread(video_path: str, summary: str, is_voice_command: bool = False):
+    """將影片工作送入常駐工作程序，並把進度事件傳回 GUI"""
+    global _voice_interaction_enabled, _current_video_job_id
+    script_type = "影片"
+
     if app_window and app_window.winfo_exists():
         app_window.after(0, update_status_safe, f"正在執行 {script_type} 程序...")
-        app_window.after(0, update_gui_safe, result_text_widget, f"\n--- 開始執行 {script_name} ---")
+        app_window.after(0, update_gui_safe, result_text_widget, f"\n--- 開始執行影片口述影像生成 ---")
     if VOICE_ENABLED: speak(f"正在啟動,{script_type}口述影像生成程序")
 
-    final_answer = f"[{script_type} 未返回明確答案]"
-    final_video_path = None
-    final_image_path = None
-    capture_next_video_path = False
-
-    process = None
     try:
-        script_path = os.path.join(os.path.dirname(__file__), script_name)
-        command = [sys.executable, script_path] + args
-        print(f"執行指令: {' '.join(command)}")
-
-        process = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            text=True, encoding='utf-8', errors='replace', bufsize=1,
-            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-        )
-
-        if process.stdout:
-            for line in iter(process.stdout.readline, ''):
-                print(line, end='')
+        worker = get_video_worker()
+        resume = worker.has_checkpoint(video_path)
+        if resume:
+            print("[影片工作程序] 偵測到先前的進度紀錄，將略過已完成的步驟。")
+        _current_video_job_id = worker.submit(video_path, summary, resume=resume)
+
+        for event in worker.iter_job_events(_current_video_job_id):
+            event_type = event.get("type")
+            if event_type == "log":
+                line = event.get("line", "")
+                print(line)
                 if app_window and app_window.winfo_exists():
                     app_window.after(0, update_gui_safe, result_text_widget, line.strip())
-                s_line = line.strip()
-                if s_line.startswith("FINAL_ANSWER:"): final_answer = s_line.replace("FINAL_ANSWER:", "").strip()
-                elif s_line.startswith("FINAL_VIDEO:"): final_video_path = s_line.replace("FINAL_VIDEO:", "").strip()
-                elif s_line.startswith("FINAL_IMAGE:"): final_image_path = s_line.replace("FINAL_IMAGE:", "").strip()
-                elif "最終影片已儲存為:" in s_line: capture_next_video_path = True
-                elif capture_next_video_path and s_line: final_video_path = s_line; capture_next_video_path = False
-            process.stdout.close()
-
-        stderr_output = ""
-        if process.stderr:
-            stderr_output = process.stderr.read()
-            process.stderr.close()
-
-        return_code = process.wait()
-
-        if return_code == 0:
-            success_msg = f"--- {script_name} 執行成功 ---"
-            print(success_msg)
-            if app_window and app_window.winfo_exists():
-                app_window.after(0, update_gui_safe, result_text_widget, success_msg)
-                app_window.after(0, update_status_safe, f"{script_type} 完成")
-            if VOICE_ENABLED: speak(f"{script_type} 處理完成")
-
-            if script_name == 'generate_video_ad.py':
+            elif event_type == "progress":
+                status = f"{script_type} 處理中 ({event.get('step')}/{event.get('total')}): {event.get('message')}"
+                if app_window and app_window.winfo_exists():
+                    app_window.after(0, update_status_safe, status)
+            elif event_type == "done":
+                final_video_path = event.get("final_video")
+                success_msg = "--- 影片口述影像生成成功 ---"
+                print(success_msg)
+                if app_window and app_window.winfo_exists():
+                    app_window.after(0, update_gui_safe, result_text_widget, success_msg)
+                    app_window.after(0, update_status_safe, f"{script_type} 完成")
+                if VOICE_ENABLED: speak(f"{script_type} 處理完成")
                 if final_video_path and os.path.exists(final_video_path):
                     if app_window and app_window.winfo_exists():
                         app_window.after(0, play_video_in_ui, final_video_path)
                         app_window.after(0, update_gui_safe, result_text_widget, f"[提示] 影片已生成: {final_video_path}")
-                else:
-                    if app_window and app_window.winfo_exists():
-                        app_window.after(0, update_gui_safe, result_text_widget, "[警告] 未找到生成的影片檔案路徑或檔案不存在。")
-
-        else:
-            error_msg_header = f"\n!!!!!!!!!! {script_name} 執行時發生嚴重錯誤 !!!!!!!!!!\n返回碼: {return_code}"
-            error_details = stderr_output if stderr_output else "[無詳細錯誤輸出]"
-            error_msg_stderr = f"\n--- 錯誤輸出 (stderr) ---\n{error_details}\n-------------------------"
-            full_error_msg = error_msg_header + error_msg_stderr
-            print(full_error_msg)
-            if app_window and app_window.winfo_exists():
-                app_window.after(0, update_gui_safe, result_text_widget, full_error_msg)
-                app_window.after(0, update_status_safe, f"{script_type} 執行失敗")
-            if VOICE_ENABLED: speak(f"啟動 {script_type} 處理程序時發生錯誤"); audio.beep_error()
+                elif app_window and app_window.winfo_exists():
+                    app_window.after(0, update_gui_safe, result_text_widget, "[警告] 未找到生成的影片檔案路徑或檔案不存在。")
+            elif event_type == "cancelled":
+                print("[影片] 工作已取消")
+                if app_window and app_window.winfo_exists():
+                    app_window.after(0, update_gui_safe, result_text_widget, "--- 影片處理已取消 ---")
+                    app_window.after(0, update_status_safe, f"{script_type} 已取消")
+                if VOICE_ENABLED: speak(f"{script_type} 處理已取消")
+            elif event_type == "error":
+                details = event.get("traceback") or "[無詳細錯誤輸出]"
+                full_error_msg = (f"\n!!!!!!!!!! 影片處理時發生嚴重錯誤 !!!!!!!!!!\n{event.get('message')}"
+                                  f"\n--- 錯誤輸出 ---\n{details}\n-------------------------")
+                print(full_error_msg)
+                if app_window and app_window.winfo_exists():
+                    app_window.after(0, update_gui_safe, result_text_widget, full_error_msg)
+                    app_window.after(0, update_status_safe, f"{script_type} 執行失敗")
+                if VOICE_ENABLED: speak(f"{script_type} 處理程序發生錯誤"); audio.beep_error()
 
-    except FileNotFoundError:
-        error_msg = f"錯誤:找不到腳本檔案 '{script_name}' 或 Python 執行檔 '{sys.executable}'"
-        print(error_msg)
-        if app_window and app_window.winfo_exists():
-             app_window.after(0, update_gui_safe, result_text_widget, error_msg)
-             app_window.after(0, update_status_safe, f"{script_type} 失敗 (找不到檔案)")
-        if VOICE_ENABLED: speak(f"啟動{script_type}失敗,找不到檔案"); audio.beep_error()
     except Exception as e:
-        error_msg = f"執行 {script_name} 時發生未預期的錯誤: {e}\n{traceback.format_exc()}"
+        error_msg = f"執行影片工作時發生未預期的錯誤: {e}\n{traceback.format_exc()}"
         print(error_msg)
         if app_window and app_window.winfo_exists():
              app_window.after(0, update_gui_safe, result_text_widget, error_msg)
              app_window.after(0, update_status_safe, f"{script_type} 失敗 (未知錯誤)")
         if VOICE_ENABLED: speak(f"啟動{script_type}時發生未知錯誤"); audio.beep_error()
     finally:
-        if process and process.poll() is None:
-            try:
-                process.terminate()
-                process.wait(timeout=1)
-            except Exception as e:
-                print(f"嘗試終止子程序時出錯: {e}")
-            finally:
-                 if process.poll() is None:
-                     process.kill()
-
+        _current_video_job_id = None
         if app_window and app_window.winfo_exists():
             app_window.after(100, enable_buttons)
             app_window.after(0, set_busy, False)
@@ -480,18 +524,31 @@ def set_busy(is_busy: bool):
 
 # --- 啟動流程 ---
 def run_image_generation_in_thread(image_path: str, description: str, is_voice_command: bool = False):
-    """在背景執行緒中直接呼叫圖像生成函式"""
+    """在背景執行緒中直接呼叫圖像生成函式 (串流顯示並逐句朗讀)"""
     global _voice_interaction_enabled
     script_type = "圖像"
+    speaker = None
     try:
         if app_window and app_window.winfo_exists():
             app_window.after(0, update_status_safe, f"正在執行 {script_type} 程序...")
             app_window.after(0, update_gui_safe, result_text_widget, f"\n--- 開始執行圖像口述影像生成 ---")
+            # 先顯示圖片並清空口述影像區塊，準備接收串流文字
+            app_window.after(0, show_image_and_text, image_path, "")
+
+        if VOICE_ENABLED:
+            speaker = SentenceSpeaker()
+
+        def on_text(chunk: str):
+            if app_window and app_window.winfo_exists():
+                app_window.after(0, append_narration_text_safe, chunk)
+            if speaker:
+                speaker.feed(chunk)
 
         import generate_image_ad
         final_answer, final_image_path = generate_image_ad.generate_narration_from_preloaded(
             image_file=image_path,
-            user_desc=description
+            user_desc=description,
+            on_text=on_text
         )
 
         success_msg = "--- 圖像口述影像生成成功 ---"
@@ -500,9 +557,9 @@ def run_image_generation_in_thread(image_path: str, description: str, is_voice_c
             app_window.after(0, update_gui_safe, result_text_widget, success_msg)
             app_window.after(0, update_status_safe, f"{script_type} 完成")
         
-        # === 修改：先顯示圖片和文字，再朗讀 ===
+        # === 修改：串流過程中已逐句顯示與朗讀，這裡以完整結果覆蓋畫面 ===
         
-        # 1. 先在畫面上顯示圖片和口述影像文字
+        # 1. 在畫面上顯示圖片和完整的口述影像文字
         if final_image_path and final_answer:
             if app_window and app_window.winfo_exists():
                 app_window.after(0, show_image_and_text, final_image_path, final_answer)
@@ -511,17 +568,11 @@ def run_image_generation_in_thread(image_path: str, description: str, is_voice_c
             if app_window and app_window.winfo_exists():
                 app_window.after(0, update_gui_safe, result_text_widget, "[提示] 未找到圖片路徑或生成結果用於顯示。")
         
-        # 2. 等待一小段時間讓 GUI 更新完成
-        time.sleep(0.1)
-        
-        # 3. 再使用 TTS 語音朗讀口述影像內容
-        if VOICE_ENABLED: 
+        # 2. 等待尚未唸完的句子朗讀完畢
+        if speaker:
+            speaker.finish()
+            print("[語音] 口述影像朗讀完成")
             speak(f"{script_type} 處理完成", wait=True)
-            # 朗讀圖像口述影像內容
-            if final_answer:
-                print("[語音] 開始朗讀口述影像內容")
-                speak(final_answer, wait=True)
-                print("[語音] 口述影像朗讀完成")
 
     except Exception as e:
         error_msg = f"執行圖像生成時發生未預期的錯誤: {e}\n{traceback.format_exc()}"
@@ -529,6 +580,7 @@ def run_image_generation_in_thread(image_path: str, description: str, is_voice_c
         if app_window and app_window.winfo_exists():
             app_window.after(0, update_gui_safe, result_text_widget, error_msg)
             app_window.after(0, update_status_safe, f"{script_type} 失敗 (未知錯誤)")
+        if speaker: speaker.finish()
         if VOICE_ENABLED: speak(f"啟動{script_type}時發生未知錯誤", wait=True); audio.beep_error()
     finally:
         if app_window and app_window.winfo_exists():
@@ -635,9 +687,7 @@ def start_video_analysis(is_voice_command: bool = False):
 
     set_busy(True)
 
-    args = ["--video_file", file_path, "--summary", desc]
-    
-    thread = threading.Thread(target=run_script_in_thread, args=('generate_video_ad.py', '影片', args, is_voice_command), daemon=True)
+    thread = threading.Thread(target=run_video_job_in_thread, args=(file_path, desc, is_voice_command), daemon=True)
     thread.start()
 
 # --- 即時攝影機相關函式 ---
@@ -1271,6 +1321,9 @@ def create_gui():
         except Exception as e:
             print(f"[警告] 無法載入音色選擇功能: {e}")
 
+    # --- 快捷鍵：Esc 取消正在執行的影片處理 ---
+    root.bind("<Escape>", lambda event: cancel_current_video_job())
+
     # --- 啟動 GUI 佇列處理 ---
     root.after(100, process_gui_queue)
 
@@ -1285,6 +1338,12 @@ if __name__ == "__main__":
     preload_thread = threading.Thread(target=preload_llama_and_db, daemon=True)
     preload_thread.start()
 
+    # --- 預先啟動常駐影片工作程序 (載入 torch / whisper / moviepy 等模組) ---
+    try:
+        get_video_worker().start()
+    except Exception as e:
+        print(f"[警告] 無法預先啟動影片工作程序: {e}")
+
     if VOICE_ENABLED:
         intro_text = (
             "歡迎使用口述影像生成系統。本系統能為視障者,"
@@ -1301,6 +1360,7 @@ if __name__ == "__main__":
     app_window.protocol("WM_DELETE_WINDOW", lambda: (
         stop_video_playback(),
         stop_live_capture(),
+        cancel_current_video_job(),
         app_window.destroy()
     ))
 
@@ -1308,4 +1368,6 @@ if __name__ == "__main__":
 
     stop_video_playback()
     stop_live_capture()
+    if _video_worker:
+        _video_worker.shutdown()
     print("應用程式已關閉。")
\ No newline at end of file
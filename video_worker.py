@@ -0,0 +1,262 @@
+# video_worker.py
+# 常駐的影片口述影像工作程序：
+#   - 以子程序執行本檔，透過 stdin / stdout 交換 JSON Lines (一行一個指令或事件)。
+#   - torch、whisper、moviepy、scenedetect、google-generativeai 只在程序啟動時載入一次，
+#     之後的每支影片都直接開始處理。
+#   - VideoWorkerClient 供 main.py 使用：啟動程序、送出工作、接收進度事件、取消工作。
+
+import os
+import sys
+import json
+import queue
+import threading
+import traceback
+import subprocess
+import uuid
+from typing import Dict, Iterator, Optional
+
+# 指令 (GUI -> 工作程序)
+#   {"type": "job", "job_id": ..., "video_file": ..., "summary": ..., "speech_backend": ..., "resume": true/false}
+#   {"type": "cancel", "job_id": ...}
+#   {"type": "shutdown"}
+# 事件 (工作程序 -> GUI)
+#   ready / fatal / started / progress / log / done / error / cancelled
+TERMINAL_EVENTS = ("done", "error", "cancelled")
+
+
+# --------------------------------------------------------------------------
+#                           工作程序端
+# --------------------------------------------------------------------------
+
+class _EventStream:
+    """取代 sys.stdout / sys.stderr，將每一行輸出包裝成 log 事件"""
+    def __init__(self, emit, state: dict, stream: str):
+        self._emit = emit
+        self._state = state
+        self._stream = stream
+        self._buffer = ""
+        self.encoding = "utf-8"
+
+    def write(self, text: str) -> int:
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self._emit({"type": "log", "job_id": self._state.get("job_id"), "stream": self._stream, "line": line})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+def serve() -> int:
+    # 事件改走私有的檔案描述元；fd 1 導向 stderr，避免 ffmpeg 等原生程式的輸出混入 JSON Lines
+    sys.stdout.flush()
+    event_fd = os.dup(1)
+    os.dup2(2, 1)
+    real_stdout = os.fdopen(event_fd, "w", encoding="utf-8", buffering=1)
+    emit_lock = threading.Lock()
+
+    def emit(event: dict):
+        with emit_lock:
+            real_stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+            real_stdout.flush()
+
+    state: Dict[str, Optional[str]] = {"job_id": None}
+    sys.stdout = _EventStream(emit, state, "stdout")
+    sys.stderr = _EventStream(emit, state, "stderr")
+
+    try:
+        import generate_video_ad
+        generate_video_ad.load_api_key()
+    except BaseException as e:  # generate_video_ad 在缺少套件時會呼叫 sys.exit；缺少 API 金鑰時引發 FileNotFoundError
+        emit({"type": "fatal", "message": f"載入 generate_video_ad 失敗: {e!r}"})
+        return 1
+
+    jobs: "queue.Queue[Optional[dict]]" = queue.Queue()
+    cancelled = set()
+
+    def read_commands():
+        for line in sys.stdin:
+            try:
+                command = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[警告] 無法解析的指令: {line.strip()}")
+                continue
+            command_type = command.get("type")
+            if command_type == "job":
+                jobs.put(command)
+            elif command_type == "cancel":
+                cancelled.add(command.get("job_id"))
+            elif command_type == "shutdown":
+                break
+        jobs.put(None)
+
+    threading.Thread(target=read_commands, daemon=True).start()
+    emit({"type": "ready", "pid": os.getpid()})
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id = job.get("job_id")
+        if job_id in cancelled:
+            emit({"type": "cancelled", "job_id": job_id})
+            continue
+
+        state["job_id"] = job_id
+        emit({"type": "started", "job_id": job_id, "video_file": job.get("video_file")})
+
+        def report(step: int, total: int, message: str):
+            emit({"type": "progress", "job_id": job_id, "step": step, "total": total, "message": message})
+
+        try:
+            final_video = generate_video_ad.run_pipeline(
+                job["video_file"], job["summary"],
+                progress=report,
+                should_cancel=lambda: job_id in cancelled,
+                speech_backend=job.get("speech_backend"),
+                resume=bool(job.get("resume")),
+            )
+            emit({"type": "done", "job_id": job_id, "final_video": final_video})
+        except generate_video_ad.PipelineCancelled:
+            emit({"type": "cancelled", "job_id": job_id})
+        except Exception as e:
+            emit({"type": "error", "job_id": job_id, "message": str(e), "traceback": traceback.format_exc()})
+        finally:
+            state["job_id"] = None
+
+    return 0
+
+
+# --------------------------------------------------------------------------
+#                           GUI 端
+# --------------------------------------------------------------------------
+
+class VideoWorkerClient:
+    """管理常駐工作程序；同一時間可排入多個工作，依序處理"""
+    def __init__(self):
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._job_events: Dict[str, "queue.Queue[dict]"] = {}
+        self._fatal_message: Optional[str] = None
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """啟動工作程序 (若尚未啟動)；可於程式啟動時呼叫以預先載入模組"""
+        with self._lock:
+            if self.is_alive():
+                return
+            self._fatal_message = None
+            env = dict(os.environ, PYTHONIOENCODING="utf-8", PYTHONUNBUFFERED="1")
+            script_path = os.path.abspath(__file__)
+            self._process = subprocess.Popen(
+                [sys.executable, script_path],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                text=True, encoding="utf-8", errors="replace", bufsize=1,
+                cwd=os.path.dirname(script_path), env=env,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
+            )
+            threading.Thread(target=self._read_events, args=(self._process,), daemon=True).start()
+            print(f"[影片工作程序] 已啟動 (PID {self._process.pid})")
+
+    @staticmethod
+    def has_checkpoint(video_file: str) -> bool:
+        """影片旁是否已有先前執行留下的 <影片名稱>_work/manifest.json (與 generate_video_ad.run_pipeline 相同位置)"""
+        base_name = os.path.splitext(os.path.basename(video_file))[0]
+        return os.path.exists(os.path.join(os.path.dirname(video_file), f"{base_name}_work", "manifest.json"))
+
+    def submit(self, video_file: str, summary: str, speech_backend: Optional[str] = None, resume: bool = False) -> str:
+        """送出工作；resume=True 時略過先前已完成且輸入未變更的步驟"""
+        self.start()
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._job_events[job_id] = queue.Queue()
+        self._send({
+            "type": "job", "job_id": job_id,
+            "video_file": video_file, "summary": summary, "speech_backend": speech_backend, "resume": resume,
+        })
+        return job_id
+
+    def cancel(self, job_id: str) -> None:
+        """要求取消工作；正在執行的工作會在下一個步驟開始前停止"""
+        self._send({"type": "cancel", "job_id": job_id})
+
+    def iter_job_events(self, job_id: str, poll_interval: float = 0.5) -> Iterator[dict]:
+        """依序產生指定工作的事件，直到 done / error / cancelled 為止"""
+        events = self._job_events[job_id]
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=poll_interval)
+                except queue.Empty:
+                    if not self.is_alive():
+                        message = self._fatal_message or "影片工作程序意外結束。"
+                        yield {"type": "error", "job_id": job_id, "message": message}
+                        return
+                    continue
+                yield event
+                if event.get("type") in TERMINAL_EVENTS:
+                    return
+        finally:
+            with self._lock:
+                self._job_events.pop(job_id, None)
+
+    def shutdown(self, timeout: float = 2.0) -> None:
+        process = self._process
+        if process is None:
+            return
+        try:
+            self._send({"type": "shutdown"})
+            process.wait(timeout=timeout)
+        except Exception:
+            pass
+        finally:
+            if process.poll() is None:
+                process.kill()
+            self._process = None
+
+    def _send(self, command: dict) -> None:
+        process = self._process
+        if process is None or process.stdin is None or process.poll() is not None:
+            raise RuntimeError("影片工作程序未在執行中。")
+        with self._lock:
+            process.stdin.write(json.dumps(command, ensure_ascii=False) + "\n")
+            process.stdin.flush()
+
+    def _read_events(self, process: subprocess.Popen) -> None:
+        for line in iter(process.stdout.readline, ""):
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                # 原生函式庫直接寫入 stdout 的內容，當作一般 log
+                event = {"type": "log", "job_id": None, "stream": "stdout", "line": line.rstrip("\n")}
+
+            event_type = event.get("type")
+            if event_type == "ready":
+                print(f"[影片工作程序] 模組載入完成，可接受工作 (PID {event.get('pid')})")
+                continue
+            if event_type == "fatal":
+                self._fatal_message = event.get("message")
+                print(f"[影片工作程序] {self._fatal_message}")
+                continue
+
+            job_id = event.get("job_id")
+            with self._lock:
+                if job_id is None:
+                    targets = list(self._job_events.values())
+                else:
+                    targets = [self._job_events[job_id]] if job_id in self._job_events else []
+            if not targets:
+                print(event.get("line", ""))
+            for target in targets:
+                target.put(event)
+
+
+if __name__ == "__main__":
+    sys.stdin.reconfigure(encoding="utf-8")
+    sys.exit(serve())
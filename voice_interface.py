@@ -13,10 +13,27 @@ import winsound
 import traceback
 import uuid
 import html
-from functools import lru_cache
-from typing import Optional
+import hashlib
+import threading
+import atexit
+from array import array
+from functools import lru_cache, partial
+from typing import Optional, Tuple
 import requests
 
+# --- 非同步 HTTP 用戶端 (可選) ---
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    print("[警告] httpx 未安裝，Azure TTS 將改用 requests + 執行緒池。")
+    HTTPX_AVAILABLE = False
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支援
+    HTTP2_AVAILABLE = HTTPX_AVAILABLE
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 # --- 語音克隆系統 ---
 try:
     from voice_cloning import voice_cloning_system, XTTS_AVAILABLE
@@ -33,8 +50,30 @@ AZURE_TTS_ENDPOINT = f"https://{AZURE_TTS_REGION}.tts.speech.microsoft.com/cogni
 AZURE_TTS_OUTPUT_FORMAT = "audio-24khz-96kbitrate-mono-mp3"
 AZURE_TTS_KEY_FILENAME = "ttsapi.txt"
 AZURE_TTS_USER_AGENT = "NarrationGeneratorApp/1.0"
+AZURE_TTS_MAX_CONNECTIONS = 32   # 連線池大小 (HTTP/2 時多個請求共用同一條連線)
+AZURE_TTS_TIMEOUT = 45
+AZURE_TTS_CHUNK_SIZE = 16 * 1024
+AZURE_TTS_STREAM_CHUNK_SIZE = 4096   # 串流播放時每個區塊的位元組數 (24kHz 約 85ms)
+TTS_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 語音快取總大小上限，超過時依最後使用時間淘汰
+TTS_CACHE_EVICT_TARGET = 0.9         # 淘汰到上限的此比例，避免每次寫入都觸發淘汰
+TTS_CACHE_MIN_AGE = 24 * 60 * 60     # 最近此秒數內用過的語音不淘汰 (正在執行的流程仍會讀取)
+# 串流播放使用的原始 PCM 輸出格式 (依 mixer 取樣率挑選，免解碼)
+AZURE_TTS_PCM_FORMATS = {
+    8000: "raw-8khz-16bit-mono-pcm",
+    16000: "raw-16khz-16bit-mono-pcm",
+    22050: "raw-22050hz-16bit-mono-pcm",
+    24000: "raw-24khz-16bit-mono-pcm",
+    44100: "raw-44100hz-16bit-mono-pcm",
+    48000: "raw-48khz-16bit-mono-pcm",
+}
 
 _session = requests.Session()
+_tts_loop = None
+_tts_loop_lock = threading.Lock()
+_async_client = None  # 只在 _tts_loop 的執行緒上建立與使用
+_tts_cache_lock = threading.Lock()
+_tts_cache_totals = {}   # cache_dir -> 目前總位元組數 (第一次寫入時掃描，之後隨寫入與淘汰累計)
+_tts_cache_scanned = {}  # cache_dir -> 上次掃描淘汰後的總位元組數
 
 
 class AzureTTSException(Exception):
@@ -45,6 +84,25 @@ class AzureTTSConfigError(AzureTTSException):
     pass
 
 
+class AzureTTSHTTPError(AzureTTSException):
+    """HTTP 或連線錯誤；status_code 為 None 代表連線失敗或逾時"""
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
 @lru_cache(maxsize=1)
 def _load_subscription_key() -> str:
     key_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), AZURE_TTS_KEY_FILENAME)
@@ -73,13 +131,21 @@ def _speech_rate_to_percent(speech_rate: float) -> str:
     return f"{diff:+.0f}%"
 
 
-def synthesize_speech_to_file(
+def estimate_mp3_duration(num_bytes: int, output_format: str = AZURE_TTS_OUTPUT_FORMAT) -> Optional[float]:
+    """Azure 的 MP3 輸出為固定位元率，時長可直接由位元組數推算；非 MP3 格式回傳 None"""
+    match = re.search(r"(\d+)kbitrate-\w+-mp3$", output_format)
+    if not match:
+        return None
+    return num_bytes * 8 / (int(match.group(1)) * 1000)
+
+
+def _build_tts_request(
     text: str,
     voice: str,
-    output_path: str,
-    speech_rate: float = 1.0,
-    language: Optional[str] = None,
-) -> None:
+    speech_rate: float,
+    language: Optional[str],
+    output_format: str = AZURE_TTS_OUTPUT_FORMAT,
+) -> Tuple[dict, bytes]:
     if not text or not text.strip():
         raise AzureTTSException("文字內容不可為空。")
 
@@ -94,32 +160,146 @@ def synthesize_speech_to_file(
         f"<prosody rate='{prosody_rate}'>{escaped_text}</prosody>"
         f"</voice></speak>"
     )
-
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
     headers = {
         "Ocp-Apim-Subscription-Key": key,
         "Content-Type": "application/ssml+xml",
-        "X-Microsoft-OutputFormat": AZURE_TTS_OUTPUT_FORMAT,
+        "X-Microsoft-OutputFormat": output_format,
         "User-Agent": AZURE_TTS_USER_AGENT,
     }
+    return headers, ssml.encode("utf-8")
+
+
+def _http_error(status_code: int, reason: str, headers) -> AzureTTSHTTPError:
+    return AzureTTSHTTPError(
+        f"Azure TTS 請求失敗: HTTP {status_code} {reason}",
+        status_code=status_code,
+        retry_after=_parse_retry_after(headers.get("Retry-After")),
+    )
+
+
+def _httpx_options() -> dict:
+    return {
+        "http2": HTTP2_AVAILABLE,
+        "limits": httpx.Limits(max_connections=AZURE_TTS_MAX_CONNECTIONS,
+                               max_keepalive_connections=AZURE_TTS_MAX_CONNECTIONS),
+        "timeout": httpx.Timeout(AZURE_TTS_TIMEOUT, connect=10),
+    }
 
+
+def _get_tts_loop() -> asyncio.AbstractEventLoop:
+    """
+    取得 Azure TTS 專用的背景事件迴圈 (常駐的 daemon 執行緒)。
+    所有 httpx 請求都在這個迴圈上執行，不論呼叫端使用哪個迴圈或執行緒，都共用同一個 AsyncClient 與連線池。
+    """
+    global _tts_loop
+    with _tts_loop_lock:
+        if _tts_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="azure-tts-loop", daemon=True).start()
+            atexit.register(_close_tts_loop, loop)
+            _tts_loop = loop
+    return _tts_loop
+
+
+def _close_tts_loop(loop: asyncio.AbstractEventLoop) -> None:
+    if not loop.is_running():
+        return
+    async def _aclose():
+        global _async_client
+        if _async_client is not None:
+            await _async_client.aclose()
+            _async_client = None
     try:
-        response = _session.post(
-            AZURE_TTS_ENDPOINT,
-            headers=headers,
-            data=ssml.encode("utf-8"),
-            timeout=45,
-        )
-        response.raise_for_status()
-    except requests.RequestException as exc:
-        raise AzureTTSException(f"Azure TTS 請求失敗: {exc}") from exc
+        asyncio.run_coroutine_threadsafe(_aclose(), loop).result(timeout=5)
+    except Exception:
+        pass
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def _run_on_tts_loop(coro):
+    """將 coroutine 送到 TTS 背景迴圈執行，回傳 concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_tts_loop())
+
+
+async def _await_on_tts_loop(coro):
+    """在任何事件迴圈中等待於 TTS 背景迴圈上執行的 coroutine"""
+    if asyncio.get_running_loop() is _get_tts_loop():
+        return await coro
+    return await asyncio.wrap_future(_run_on_tts_loop(coro))
 
+
+def _get_async_client():
+    """(只能在 TTS 背景迴圈上呼叫) 取得共用的 AsyncClient"""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(**_httpx_options())
+    return _async_client
+
+
+def _stream_response_to_file(chunks, output_path: str) -> int:
+    """將回應區塊逐塊寫入 output_path，回傳總位元組數"""
+    written = 0
     try:
         with open(output_path, "wb") as f:
-            f.write(response.content)
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
     except OSError as exc:
         raise AzureTTSException(f"寫入語音檔案時發生錯誤: {exc}") from exc
+    return written
+
+
+async def _download_speech_httpx(headers: dict, body: bytes, output_path: str) -> int:
+    """(在 TTS 背景迴圈上執行) 以共用的 AsyncClient 發出請求並將回應逐塊寫入檔案，回傳總位元組數"""
+    written = 0
+    try:
+        async with _get_async_client().stream("POST", AZURE_TTS_ENDPOINT, headers=headers, content=body) as response:
+            if response.status_code >= 400:
+                raise _http_error(response.status_code, response.reason_phrase, response.headers)
+            with open(output_path, "wb") as f:
+                async for chunk in response.aiter_bytes(AZURE_TTS_CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+    except httpx.HTTPError as exc:
+        raise AzureTTSHTTPError(f"Azure TTS 請求失敗: {exc}") from exc
+    except OSError as exc:
+        raise AzureTTSException(f"寫入語音檔案時發生錯誤: {exc}") from exc
+    return written
+
+
+def synthesize_speech_to_file(
+    text: str,
+    voice: str,
+    output_path: str,
+    speech_rate: float = 1.0,
+    language: Optional[str] = None,
+) -> Optional[float]:
+    """合成語音並寫入 output_path，回傳語音長度 (秒)；輸出格式無法推算長度時回傳 None"""
+    headers, body = _build_tts_request(text, voice, speech_rate, language)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    if HTTPX_AVAILABLE:
+        written = _run_on_tts_loop(_download_speech_httpx(headers, body, output_path)).result()
+        return estimate_mp3_duration(written)
+
+    try:
+        response = _session.post(
+            AZURE_TTS_ENDPOINT,
+            headers=headers,
+            data=body,
+            timeout=AZURE_TTS_TIMEOUT,
+            stream=True,
+        )
+    except requests.RequestException as exc:
+        raise AzureTTSHTTPError(f"Azure TTS 請求失敗: {exc}") from exc
+    with response:
+        if response.status_code >= 400:
+            raise _http_error(response.status_code, response.reason, response.headers)
+        try:
+            written = _stream_response_to_file(response.iter_content(AZURE_TTS_CHUNK_SIZE), output_path)
+        except requests.RequestException as exc:
+            raise AzureTTSHTTPError(f"Azure TTS 請求失敗: {exc}") from exc
+    return estimate_mp3_duration(written)
 
 
 def _run_in_executor_sync(func, *args):
@@ -137,17 +317,226 @@ async def synthesize_speech_to_file_async(
     output_path: str,
     speech_rate: float = 1.0,
     language: Optional[str] = None,
-) -> None:
+) -> Optional[float]:
+    """
+    synthesize_speech_to_file 的非同步版本。
+    安裝 httpx 時請求在 TTS 背景迴圈上以共用連線池 (keep-alive，可用時走 HTTP/2) 發出，回應逐塊寫入檔案；
+    否則退回在執行緒池中執行同步版本。
+    """
+    if not HTTPX_AVAILABLE:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            synthesize_speech_to_file,
+            text,
+            voice,
+            output_path,
+            speech_rate,
+            language,
+        )
+
+    headers, body = _build_tts_request(text, voice, speech_rate, language)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    written = await _await_on_tts_loop(_download_speech_httpx(headers, body, output_path))
+    return estimate_mp3_duration(written)
+
+
+async def stream_speech_pcm_async(
+    text: str,
+    voice: str,
+    sample_rate: int,
+    speech_rate: float = 1.0,
+    language: Optional[str] = None,
+):
+    """
+    以串流方式合成語音，回應區塊一到就產生 16-bit 單聲道 PCM (little-endian)，不寫入任何檔案。
+    sample_rate 必須是 AZURE_TTS_PCM_FORMATS 支援的取樣率。
+    安裝 httpx 時必須在 TTS 背景迴圈上迭代 (例如透過 _run_on_tts_loop 執行的 coroutine)。
+    """
+    output_format = AZURE_TTS_PCM_FORMATS.get(sample_rate)
+    if output_format is None:
+        raise AzureTTSException(f"不支援的 PCM 取樣率: {sample_rate}")
+    headers, body = _build_tts_request(text, voice, speech_rate, language, output_format)
+
+    if HTTPX_AVAILABLE:
+        try:
+            async with _get_async_client().stream("POST", AZURE_TTS_ENDPOINT, headers=headers, content=body) as response:
+                if response.status_code >= 400:
+                    raise _http_error(response.status_code, response.reason_phrase, response.headers)
+                async for chunk in response.aiter_bytes(AZURE_TTS_STREAM_CHUNK_SIZE):
+                    yield chunk
+        except httpx.HTTPError as exc:
+            raise AzureTTSHTTPError(f"Azure TTS 請求失敗: {exc}") from exc
+        return
+
+    # 未安裝 httpx：在執行緒池中逐塊讀取 requests 的串流回應
     loop = asyncio.get_running_loop()
-    await loop.run_in_executor(
-        None,
-        synthesize_speech_to_file,
-        text,
-        voice,
-        output_path,
-        speech_rate,
-        language,
+    try:
+        response = await loop.run_in_executor(None, partial(
+            _session.post,
+            AZURE_TTS_ENDPOINT,
+            headers=headers,
+            data=body,
+            timeout=AZURE_TTS_TIMEOUT,
+            stream=True,
+        ))
+    except requests.RequestException as exc:
+        raise AzureTTSHTTPError(f"Azure TTS 請求失敗: {exc}") from exc
+    with response:
+        if response.status_code >= 400:
+            raise _http_error(response.status_code, response.reason, response.headers)
+        chunks = response.iter_content(AZURE_TTS_STREAM_CHUNK_SIZE)
+        while True:
+            try:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+            except requests.RequestException as exc:
+                raise AzureTTSHTTPError(f"Azure TTS 請求失敗: {exc}") from exc
+            if chunk is None:
+                break
+            if chunk:
+                yield chunk
+
+
+def tts_cache_key(
+    text: str,
+    voice: str,
+    speech_rate: float = 1.0,
+    language: Optional[str] = None,
+    output_format: str = AZURE_TTS_OUTPUT_FORMAT,
+) -> str:
+    """以 (文字, 音色, 語速, 語系, 輸出格式) 計算語音快取的內容雜湊"""
+    locale = language or _infer_locale_from_voice(voice)
+    payload = json.dumps(
+        [text.strip(), voice, _speech_rate_to_percent(speech_rate), locale, output_format],
+        ensure_ascii=False,
     )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _tts_cache_paths(cache_dir: str, key: str) -> Tuple[str, str]:
+    base = os.path.join(cache_dir, key[:2], key)
+    return base + ".mp3", base + ".json"
+
+
+def _read_tts_cache(cache_dir: str, key: str) -> Optional[Tuple[str, Optional[float]]]:
+    audio_path, meta_path = _tts_cache_paths(cache_dir, key)
+    if not (os.path.exists(audio_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            duration = json.load(f).get("duration")
+        os.utime(audio_path, None)
+        os.utime(meta_path, None)
+    except (OSError, ValueError):
+        return None
+    return audio_path, duration
+
+
+def _scan_tts_cache(cache_dir: str) -> list:
+    """回傳 [(最後使用時間, 位元組數, [語音檔, 資訊檔])]，同一鍵的 .mp3 與 .json 視為一個項目"""
+    entries = {}
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            base, ext = os.path.splitext(name)
+            if ext not in (".mp3", ".json"): continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            mtime, size, paths = entries.get(base, (0.0, 0, []))
+            entries[base] = (max(mtime, st.st_mtime), size + st.st_size, paths + [path])
+    return list(entries.values())
+
+
+def prune_tts_cache(cache_dir: str, max_bytes: Optional[int] = None) -> int:
+    """
+    語音快取超過 max_bytes (預設 TTS_CACHE_MAX_BYTES) 時依最後使用時間淘汰，直到降至上限的 TTS_CACHE_EVICT_TARGET；
+    TTS_CACHE_MIN_AGE 內用過的項目保留。回傳淘汰後的總位元組數。
+    """
+    max_bytes = TTS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _tts_cache_lock:
+        entries = _scan_tts_cache(cache_dir)
+        total = sum(size for _, size, _ in entries)
+        if total > max_bytes:
+            target = int(max_bytes * TTS_CACHE_EVICT_TARGET)
+            cutoff = time.time() - TTS_CACHE_MIN_AGE
+            for mtime, size, paths in sorted(entries):
+                if total <= target or mtime > cutoff: break
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+        _tts_cache_totals[cache_dir] = _tts_cache_scanned[cache_dir] = total
+        return total
+
+
+def _record_tts_cache_write(cache_dir: str, added_bytes: int) -> None:
+    """
+    累計寫入量；超過上限時才重新掃描目錄並淘汰。
+    上次淘汰後仍超過上限 (項目都太新) 時，要再多寫入一段淘汰餘量才會重新掃描。
+    """
+    with _tts_cache_lock:
+        total = _tts_cache_totals.get(cache_dir)
+        if total is not None:
+            total = _tts_cache_totals[cache_dir] = total + added_bytes
+            slack = TTS_CACHE_MAX_BYTES * (1 - TTS_CACHE_EVICT_TARGET)
+            threshold = max(TTS_CACHE_MAX_BYTES, _tts_cache_scanned[cache_dir] + slack)
+    if total is None or total > threshold:
+        prune_tts_cache(cache_dir)
+
+
+def _write_tts_cache_meta(cache_dir: str, key: str, text: str, voice: str, duration: Optional[float]) -> None:
+    _, meta_path = _tts_cache_paths(cache_dir, key)
+    try:
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"text": text, "voice": voice, "duration": duration}, f, ensure_ascii=False)
+    except OSError as exc:
+        print(f"[警告] 無法寫入語音快取資訊: {exc}")
+
+
+def synthesize_speech_cached(
+    text: str,
+    voice: str,
+    cache_dir: str,
+    speech_rate: float = 1.0,
+    language: Optional[str] = None,
+) -> Tuple[str, Optional[float], bool]:
+    """synthesize_speech_cached_async 的同步版本 (在 TTS 背景迴圈上執行，不可從該迴圈內呼叫)"""
+    return _run_on_tts_loop(
+        synthesize_speech_cached_async(text, voice, cache_dir, speech_rate, language)
+    ).result()
+
+
+async def synthesize_speech_cached_async(
+    text: str,
+    voice: str,
+    cache_dir: str,
+    speech_rate: float = 1.0,
+    language: Optional[str] = None,
+) -> Tuple[str, Optional[float], bool]:
+    """
+    以內容雜湊快取語音檔：相同的 (文字, 音色, 語速, 語系, 輸出格式) 只合成一次。
+    回傳 (語音檔路徑, 長度秒數, 是否命中快取)。
+    """
+    key = tts_cache_key(text, voice, speech_rate, language)
+    cached = _read_tts_cache(cache_dir, key)
+    if cached:
+        return cached + (True,)
+    audio_path, _ = _tts_cache_paths(cache_dir, key)
+    temp_path = f"{audio_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        duration = await synthesize_speech_to_file_async(text, voice, temp_path, speech_rate, language)
+        os.replace(temp_path, audio_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    _write_tts_cache_meta(cache_dir, key, text, voice, duration)
+    added_bytes = sum(os.path.getsize(p) for p in _tts_cache_paths(cache_dir, key) if os.path.exists(p))
+    await asyncio.get_running_loop().run_in_executor(None, _record_tts_cache_write, cache_dir, added_bytes)
+    return audio_path, duration, False
 
 # --- Azure TTS 整合結束 ---
 
@@ -259,6 +648,7 @@ except RuntimeError:
 
 try:
     pygame.mixer.init()
+    pygame.mixer.set_reserved(1)  # 保留聲道給串流語音播放 (STREAM_CHANNEL_ID)
     print("Pygame mixer 初始化成功。")
 except pygame.error as e:
     print(f"[嚴重警告] Pygame mixer 初始化失敗: {e}")
@@ -275,6 +665,88 @@ def detect_language(text):
     chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
     return "en-US" if english_chars > chinese_chars else "zh-TW"
 
+STREAM_PREBUFFER_SECONDS = 0.2   # 串流播放前先緩衝的音訊長度
+STREAM_MIN_QUEUE_SECONDS = 0.2   # 每次排入聲道佇列的最短音訊長度 (最後一段除外)
+STREAM_POLL_INTERVAL = 0.05
+STREAM_CHANNEL_ID = 0
+_current_player = None  # 目前使用保留聲道的串流播放器 (只在 TTS 背景迴圈上存取)
+
+
+class PCMStreamPlayer:
+    """
+    邊收邊播 16-bit 單聲道 PCM：緩衝 STREAM_PREBUFFER_SECONDS 後即開始播放，
+    之後每當保留聲道的佇列空出來，就把目前累積的資料包成一個 Sound 排入。
+    """
+    def __init__(self, volume: float = 1.0):
+        self.sample_rate, _, self.channels = pygame.mixer.get_init()
+        bytes_per_second = self.sample_rate * 2 * self.channels
+        self._prebuffer = int(STREAM_PREBUFFER_SECONDS * bytes_per_second)
+        self._min_queue = int(STREAM_MIN_QUEUE_SECONDS * bytes_per_second)
+        self._pending = bytearray()
+        self._remainder = b""
+        self._started = False
+        self._finished = False
+        self._stopped = False
+        self._volume = volume
+        self._channel = pygame.mixer.Channel(STREAM_CHANNEL_ID)
+
+    @staticmethod
+    def mixer_supported() -> bool:
+        """mixer 必須是 16-bit、單/雙聲道，且取樣率是 Azure 原始 PCM 輸出支援的值"""
+        init = pygame.mixer.get_init()
+        if not init:
+            return False
+        frequency, size, channels = init
+        return size == -16 and channels in (1, 2) and frequency in AZURE_TTS_PCM_FORMATS
+
+    def feed(self, chunk: bytes) -> None:
+        if self._stopped:
+            return
+        data = self._remainder + chunk
+        cut = len(data) - len(data) % 2  # 區塊邊界可能切在樣本中間
+        self._remainder = data[cut:]
+        samples = data[:cut]
+        if self.channels == 2:
+            mono = array("h")
+            mono.frombytes(samples)
+            stereo = array("h", bytes(len(samples) * 2))
+            stereo[0::2] = mono
+            stereo[1::2] = mono
+            samples = stereo.tobytes()
+        self._pending += samples
+        self.pump()
+
+    def finish(self) -> None:
+        self._finished = True
+        self.pump()
+
+    def pump(self) -> bool:
+        """把累積的資料排入聲道；仍有資料待播或正在播放時回傳 True"""
+        if self._stopped:
+            return False
+        if self._pending and self._channel.get_queue() is None:
+            if self._finished:
+                threshold = 0
+            else:
+                threshold = self._min_queue if self._started else self._prebuffer
+            if len(self._pending) >= threshold:
+                sound = pygame.mixer.Sound(buffer=bytes(self._pending))
+                self._pending.clear()
+                if self._started:
+                    self._channel.queue(sound)  # 聲道閒置 (資料供應不及) 時會立即播放
+                else:
+                    self._channel.play(sound)
+                    self._channel.set_volume(self._volume)
+                    self._started = True
+        return bool(self._pending) or self._channel.get_busy()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._pending.clear()
+        if pygame.mixer.get_init():
+            self._channel.stop()
+
+
 def speak(text, wait=True):
     """增強版語音輸出，包含語音克隆支援和錯誤處理"""
     if not text or not text.strip(): return
@@ -304,13 +776,55 @@ def speak(text, wait=True):
     lang_code = detect_language(text)
     voice = get_current_voice() # 使用目前選定的音色
 
+    locale = LANG_CONFIG[lang_code].get("locale", "zh-TW")
+
+    async def _stream_speech():
+        """串流路徑：PCM 區塊一到就送進 mixer，不落地暫存檔"""
+        global _current_player
+        if _current_player is not None:
+            _current_player.stop()  # 新的語音取代仍在播放的語音 (與 mixer.music.load 的行為一致)
+        player = _current_player = PCMStreamPlayer(voice_ux.volume)
+        completed = False
+        try:
+            async for chunk in stream_speech_pcm_async(
+                text,
+                voice,
+                player.sample_rate,
+                speech_rate=speech_rate,
+                language=locale,
+            ):
+                if not pygame.mixer.get_init():
+                    print("[警告] Pygame mixer 在串流語音時變為未初始化狀態。")
+                    return
+                player.feed(chunk)
+            player.finish()
+
+            while pygame.mixer.get_init() and player.pump():
+                await asyncio.sleep(STREAM_POLL_INTERVAL)
+            completed = True
+
+        except AzureTTSException as e:
+            print(f"語音生成錯誤 (Azure TTS): {e}")
+            audio.beep_error()
+        except pygame.error as pg_err:
+            print(f"Pygame 串流播放錯誤: {pg_err}")
+            audio.beep_error()
+        except Exception as e:
+            print(f"語音生成或播放時發生未知錯誤: {e}")
+            traceback.print_exc()
+            audio.beep_error()
+        finally:
+            if not completed:
+                player.stop()
+            if _current_player is player:
+                _current_player = None
+
     temp_dir = "temp_audio"
-    os.makedirs(temp_dir, exist_ok=True)
     output_file = os.path.join(temp_dir, f"speech_{uuid.uuid4()}.mp3")
 
     async def _generate_speech():
+        """mixer 格式無法直接播放 PCM 時的回退路徑：整段下載成 MP3 再播放"""
         try:
-            locale = LANG_CONFIG[lang_code].get("locale", "zh-TW")
             await synthesize_speech_to_file_async(
                 text,
                 voice,
@@ -332,9 +846,8 @@ def speak(text, wait=True):
                 audio.beep_error()
                 return
 
-            if wait:
-                while pygame.mixer.get_init() and pygame.mixer.music.get_busy():
-                    await asyncio.sleep(0.1)
+            while pygame.mixer.get_init() and pygame.mixer.music.get_busy():
+                await asyncio.sleep(0.1)
 
         except AzureTTSException as e:
             print(f"語音生成錯誤 (Azure TTS): {e}")
@@ -367,14 +880,21 @@ def speak(text, wait=True):
                 except Exception as e:
                     print(f"[警告] 刪除暫存語音檔時發生錯誤: {e}")
 
+    # 語音一律在 TTS 背景迴圈上合成與播放，每句共用同一個連線池；
+    # wait=True 時阻塞到播放結束 (在事件迴圈內呼叫時不阻塞，以免卡住該迴圈)
+    generate = _stream_speech if PCMStreamPlayer.mixer_supported() else _generate_speech
+    future = _run_on_tts_loop(generate())
+    if not wait:
+        return
     try:
-        loop = asyncio.get_running_loop()
-        loop.create_task(_generate_speech())
+        asyncio.get_running_loop()
+        return
     except RuntimeError:
-        try:
-            asyncio.run(_generate_speech())
-        except Exception as e:
-            print(f"執行 asyncio.run 時出錯: {e}")
+        pass
+    try:
+        future.result()
+    except Exception as e:
+        print(f"等待語音播放時出錯: {e}")
 
 
 def _generate_cloned_voice(text: str) -> Optional[str]: